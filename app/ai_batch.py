@@ -0,0 +1,251 @@
+"""
+Batch AI summarization for many events at once (e.g. after a conference day).
+
+Personas for all events are gathered concurrently. Events with at most
+SMALL_EVENT_PERSONAS attendees are packed, up to MAX_EVENTS_PER_REQUEST and
+MAX_PERSONAS_PER_REQUEST at a time, into one LLM request that asks for a JSON
+object with one analysis per event; larger events get the regular single-event
+prompt. Each event's result is saved as its own ai_summaries record, whose
+`request` is the prompt that event would have had on its own. Events missing
+from a packed response are retried on their own. At most
+AI_BATCH_CONCURRENCY LLM requests run at the same time, across all batches of
+this worker. Progress is kept in the `ai_batches` collection so any worker can
+report it.
+
+    python ai_batch.py <event_id> [event_id ...]
+    python ai_batch.py --date 2025-03-29
+"""
+import asyncio
+import json
+import logging
+import re
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+import all_crud
+from ai_integration import (
+    SYSTEM_PROMPT, build_recommendation_prompt, complete_llm, format_persona,
+)
+from config import settings
+from mongodb import database
+
+logger = logging.getLogger(__name__)
+
+SMALL_EVENT_PERSONAS = 40
+MAX_EVENTS_PER_REQUEST = 8
+MAX_PERSONAS_PER_REQUEST = 160
+# response budget per event in a packed request
+TOKENS_PER_PACKED_EVENT = 600
+
+BATCH_SYSTEM_PROMPT = SYSTEM_PROMPT + (
+    " You answer with a single JSON object and nothing else."
+)
+
+# progress reports, keyed by batch_id
+batch_collection = database.ai_batches
+
+_slots = asyncio.Semaphore(settings.AI_BATCH_CONCURRENCY)
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def build_packed_prompt(events: List[Tuple[str, List[Dict[str, Any]]]]) -> str:
+    """
+    One prompt covering several events. Events are labelled E1, E2, ... and the
+    LLM is asked for {"E1": "...", "E2": "...", ...}.
+    """
+    lines = []
+    for i, (_, personas) in enumerate(events, 1):
+        lines.append(f"### Event E{i}: User Persona Analysis")
+        lines.extend(format_persona(persona) for persona in personas)
+        lines.append("")
+    lines.append("### Instructions:")
+    lines.append(
+        "For EACH event above separately, provide a concise analysis of the overall sentiment and trends of its "
+        "personas, then propose 2–3 event recommendations tailored to them, each with a brief itinerary "
+        "(including duration, key sessions, and objectives) that would foster better connectivity and engagement. "
+        "Respond with one JSON object whose keys are the event labels "
+        f"({', '.join(f'E{i}' for i in range(1, len(events) + 1))}) and whose values are the "
+        "analysis and recommendations for that event as a Markdown string."
+    )
+    return "\n".join(lines)
+
+
+def parse_packed_response(text: str, count: int) -> Dict[int, str]:
+    """Map event index (0-based) to its analysis; unusable entries are left out."""
+    try:
+        data = json.loads(_FENCE.sub("", text.strip()))
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    results = {}
+    for i in range(count):
+        value = data.get(f"E{i + 1}")
+        if isinstance(value, str) and value.strip():
+            results[i] = value.strip()
+    return results
+
+
+def pack(events: List[Tuple[str, List[Dict[str, Any]]]]) -> List[List[Tuple[str, List[Dict[str, Any]]]]]:
+    """Group events into LLM requests: small events together, large ones alone."""
+    groups, current, personas = [], [], 0
+    for event in sorted(events, key=lambda e: len(e[1])):
+        size = len(event[1])
+        if size > SMALL_EVENT_PERSONAS:
+            groups.append([event])
+            continue
+        if current and (len(current) >= MAX_EVENTS_PER_REQUEST
+                        or personas + size > MAX_PERSONAS_PER_REQUEST):
+            groups.append(current)
+            current, personas = [], 0
+        current.append(event)
+        personas += size
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def _update(progress: Dict[str, Any], counter: str,
+                  event_id: Optional[str] = None,
+                  result: Optional[Dict[str, Any]] = None) -> None:
+    """Count `counter` (and record one event's result) locally and in the collection."""
+    progress[counter] += 1
+    update: Dict[str, Any] = {"$inc": {counter: 1}}
+    if event_id is not None:
+        progress["events"][event_id] = result
+        update["$set"] = {f"events.{event_id}": result}
+    await batch_collection.update_one({"_id": progress["batch_id"]}, update)
+
+
+async def _save(event_id: str, personas: List[Dict[str, Any]], response: str,
+                progress: Dict[str, Any]) -> None:
+    summary = await all_crud.create_ai_summary({
+        "event_id": ObjectId(event_id),
+        "request": build_recommendation_prompt(personas),
+        "response": response,
+        "created_at": datetime.utcnow(),
+    })
+    await _update(progress, "saved", event_id,
+                  {"status": "saved", "summary_id": str(summary.id)})
+
+
+async def _run_single(event_id: str, personas: List[Dict[str, Any]],
+                      progress: Dict[str, Any]) -> None:
+    async with _slots:
+        await _update(progress, "llm_requests")
+        response = await complete_llm(build_recommendation_prompt(personas))
+    await _save(event_id, personas, response, progress)
+
+
+async def _run_group(group: List[Tuple[str, List[Dict[str, Any]]]],
+                     progress: Dict[str, Any]) -> None:
+    try:
+        if len(group) == 1:
+            await _run_single(*group[0], progress)
+            return
+        prompt = build_packed_prompt(group)
+        max_tokens = min(4096, TOKENS_PER_PACKED_EVENT * len(group))
+        async with _slots:
+            await _update(progress, "llm_requests")
+            text = await complete_llm(prompt, BATCH_SYSTEM_PROMPT, max_tokens)
+        results = parse_packed_response(text, len(group))
+        for i, (event_id, personas) in enumerate(group):
+            if i in results:
+                await _save(event_id, personas, results[i], progress)
+        # whatever the packed answer did not cover is asked for on its own
+        await asyncio.gather(*(
+            _run_group([event], progress)
+            for i, event in enumerate(group) if i not in results))
+    except Exception as e:
+        logger.exception("AI batch request for %d events failed", len(group))
+        for event_id, _ in group:
+            if event_id not in progress["events"]:
+                await _update(progress, "failed", event_id,
+                              {"status": "failed", "detail": str(e)})
+
+
+async def _track(event_ids: List[str]) -> Dict[str, Any]:
+    batch_id = str(ObjectId())
+    progress: Dict[str, Any] = {
+        "batch_id": batch_id, "status": "running", "requested": len(event_ids),
+        "saved": 0, "skipped": 0, "failed": 0, "llm_requests": 0, "events": {},
+        "started_at": datetime.utcnow(), "finished_at": None,
+    }
+    await batch_collection.insert_one({"_id": batch_id, **progress})
+    return progress
+
+
+async def get_batch(batch_id: str) -> Optional[Dict[str, Any]]:
+    return await batch_collection.find_one({"_id": batch_id}, {"_id": 0})
+
+
+async def _summarize(event_ids: List[str], progress: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        event_ids = list(dict.fromkeys(event_ids))
+        all_personas = await asyncio.gather(
+            *(all_crud.get_event_personas(e) for e in event_ids))
+        events = []
+        for event_id, personas in zip(event_ids, all_personas):
+            if personas:
+                events.append((event_id, personas))
+            else:
+                await _update(progress, "skipped", event_id,
+                              {"status": "skipped", "detail": "No persona data"})
+
+        await asyncio.gather(*(_run_group(g, progress) for g in pack(events)))
+        progress["status"] = "finished"
+    except Exception as e:
+        progress["status"] = "failed"
+        progress["detail"] = str(e)
+    progress["finished_at"] = datetime.utcnow()
+    await batch_collection.update_one({"_id": progress["batch_id"]}, {"$set": {
+        field: progress.get(field) for field in ("status", "detail", "finished_at")}})
+    return progress
+
+
+async def summarize_events(event_ids: List[str]) -> Dict[str, Any]:
+    """
+    Generate and save AI summaries for several events.
+
+    :param event_ids: The events' IDs as strings.
+    :return: The final progress report with a per-event status.
+    """
+    return await _summarize(event_ids, await _track(event_ids))
+
+
+_tasks = set()
+
+
+async def start(event_ids: List[str]) -> Dict[str, Any]:
+    """Run summarize_events in the background; returns the initial progress report."""
+    progress = await _track(event_ids)
+    task = asyncio.create_task(_summarize(event_ids, progress))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return progress
+
+
+async def event_ids_on(day: datetime) -> List[str]:
+    cursor = all_crud.event_export_cursor(day, day + timedelta(days=1), ["_id"])
+    return [str(doc["_id"]) async for doc in cursor]
+
+
+if __name__ == "__main__":
+    async def main(args: List[str]):
+        if args[:1] == ["--date"] and len(args) == 2:
+            event_ids = await event_ids_on(datetime.fromisoformat(args[1]))
+        else:
+            event_ids = args
+        if not event_ids:
+            sys.exit(__doc__)
+        report = await summarize_events(event_ids)
+        for event_id, result in report["events"].items():
+            print(f"{event_id}: {result}")
+        print(f"{report['saved']} saved, {report['skipped']} skipped, "
+              f"{report['failed']} failed in {report['llm_requests']} LLM requests")
+
+    asyncio.run(main(sys.argv[1:]))
@@ -2,6 +2,7 @@ from pyobjectid import PyObjectId  # For conversion in our model, if needed
 from all_crud import create_ai_summary
 # existing CRUD join function for personas
 from all_crud import get_event_personas
+from collections import Counter
 from typing import List, Dict, Any
 from datetime import datetime
 import asyncio
@@ -11,49 +12,100 @@ from azure.ai.inference import ChatCompletionsClient
 from azure.ai.inference.models import SystemMessage, UserMessage
 from azure.core.credentials import AzureKeyCredential
 from config import settings
+import llm_guard
 
-# Initialize Azure client for inference
+# Initialize Azure client for inference. Retries and hedging are done by
+# llm_guard, so the SDK's own retry policy is turned off.
 client = ChatCompletionsClient(
-    endpoint="https://models.inference.ai.azure.com",
+    endpoint=settings.LLM_ENDPOINT,
     credential=AzureKeyCredential(settings.GITHUB_TOKEN),
+    retry_total=0,
+    read_timeout=settings.LLM_TIMEOUT_SECONDS,
 )
 
 
-def call_azure_llm(prompt: str) -> str:
+SYSTEM_PROMPT = (
+    "You are an expert assistant skilled in analyzing user persona data, "
+    "extracting sentiment insights, and suggesting innovative event recommendations."
+)
+
+
+def call_azure_llm(prompt: str, system_prompt: str = SYSTEM_PROMPT,
+                   max_tokens: int = 2048) -> str:
     """
     Call Azure's ChatCompletionsClient to get a summary and recommendations.
+    Blocking; async code goes through complete_llm instead.
     """
     response = client.complete(
         messages=[
-            # Optional: add a system message to set context
-            SystemMessage(
-                "You are an expert assistant skilled in analyzing user persona data, "
-                "extracting sentiment insights, and suggesting innovative event recommendations."
-            ),
+            SystemMessage(system_prompt),
             UserMessage(prompt)
         ],
         model="DeepSeek-V3",  # You can switch this to 'gpt-4' or 'gpt-3.5-turbo'
         temperature=0.8,
-        max_tokens=2048,
+        max_tokens=max_tokens,
         top_p=0.9
     )
     return response.choices[0].message.content
 
 
+async def complete_llm(prompt: str, system_prompt: str = SYSTEM_PROMPT,
+                       max_tokens: int = 2048) -> str:
+    """
+    call_azure_llm with hedging, a deadline and the circuit breaker.
+
+    :raises llm_guard.LLMUnavailableError: No answer could be obtained.
+    """
+    return await llm_guard.call(call_azure_llm, prompt, system_prompt, max_tokens)
+
+
+# At most this many personas are listed in a prompt. Larger events are
+# described by counts over all attendees plus an evenly spaced sample, so the
+# prompt stays well within the model's context whatever the event size.
+MAX_PROMPT_PERSONAS = 150
+TOP_VALUES = 10
+
+
+def format_persona(persona: dict) -> str:
+    major = persona.get("major", "N/A")
+    year = persona.get("year", "N/A")
+    interests = ", ".join(persona.get("interests", [])) or "N/A"
+    personality = persona.get("personality_type", "N/A")
+    return f"- Major: {major}, Year: {year}, Interests: {interests}, Personality: {personality}"
+
+
+def summarize_personas(personas: list) -> List[str]:
+    """The most common values of each attribute across all personas, with counts."""
+    def top(values) -> str:
+        counts = Counter(v for v in values if v not in (None, ""))
+        return ", ".join(f"{v} ({n})" for v, n in counts.most_common(TOP_VALUES)) or "N/A"
+
+    return [
+        f"{len(personas)} attendees in total.",
+        f"- Most common majors: {top(p.get('major') for p in personas)}",
+        f"- Most common years: {top(p.get('year') for p in personas)}",
+        f"- Most common interests: "
+        f"{top(i for p in personas for i in p.get('interests') or [])}",
+        f"- Most common personality types: "
+        f"{top(p.get('personality_type') for p in personas)}",
+    ]
+
+
 def build_recommendation_prompt(personas: list) -> str:
     """
     Construct a prompt that summarizes the user personas and instructs the LLM
     to analyze the sentiment and propose 2-3 event recommendations with a brief itinerary.
     Only descriptive attributes are used (major, year, interests, personality_type).
+    Events with more than MAX_PROMPT_PERSONAS attendees get attribute counts and
+    a sample instead of the full list.
     """
     lines = ["### User Persona Analysis:"]
-    for persona in personas:
-        major = persona.get("major", "N/A")
-        year = persona.get("year", "N/A")
-        interests = ", ".join(persona.get("interests", [])) or "N/A"
-        personality = persona.get("personality_type", "N/A")
-        lines.append(
-            f"- Major: {major}, Year: {year}, Interests: {interests}, Personality: {personality}")
+    if len(personas) > MAX_PROMPT_PERSONAS:
+        lines.extend(summarize_personas(personas))
+        step = len(personas) / MAX_PROMPT_PERSONAS
+        personas = [personas[int(i * step)] for i in range(MAX_PROMPT_PERSONAS)]
+        lines.append(f"Sample of {MAX_PROMPT_PERSONAS} attendees:")
+    lines.extend(format_persona(persona) for persona in personas)
 
     lines.append("\n### Instructions:")
     lines.append(
@@ -74,7 +126,7 @@ async def generate_recommendation(event_id: str) -> Dict[str, Any]:
         raise Exception("No persona data found for this event.")
 
     prompt = build_recommendation_prompt(personas)
-    recommendation = call_azure_llm(prompt)
+    recommendation = await complete_llm(prompt)
 
     # Build the AI summary record (note: event_id needs to be converted to PyObjectId)
     ai_summary_data = {
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
+from typing import List, Optional
 from pyobjectid import PyObjectId
 from bson import ObjectId
 
@@ -22,3 +23,40 @@ class AISummaryDB(AISummaryCreate):
         arbitrary_types_allowed = True
         from_attributes = True
         json_encoders = {ObjectId: str}
+
+
+class AISummaryListItem(BaseModel):
+    """
+    History entry: sizes and previews of the prompt/response instead of the
+    full bodies, which are only included on request.
+    """
+    id: PyObjectId = Field(..., alias="_id")
+    event_id: PyObjectId
+    created_at: datetime
+    request_length: int
+    response_length: int
+    request_preview: str
+    response_preview: str
+    request: Optional[str] = None
+    response: Optional[str] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+        populate_by_name = True
+        json_encoders = {ObjectId: str}
+
+
+class AISummaryPage(BaseModel):
+    items: List[AISummaryListItem]
+    # pass back as `cursor` to get the next (older) page; None on the last page
+    next_cursor: Optional[str] = None
+
+
+class AIBatchRequest(BaseModel):
+    # explicit event ids, or every event whose date falls on `date`
+    event_ids: List[PyObjectId] = []
+    date: Optional[datetime] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
@@ -1,17 +1,41 @@
 from datetime import datetime
 from typing import Annotated, Optional, List
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+import asyncio
+from fastapi import (
+    APIRouter, HTTPException, status, Depends, Query, Request, Response,
+    WebSocket, WebSocketDisconnect,
+)
 from fastapi.encoders import jsonable_encoder
 from user_model import UserForm, UserAuth
 from all_model import (
-    UserProfileCreate, UserProfileDB,
+    UserProfileCreate, UserProfileDB, UserProfileUpdate,
     EventCreate, EventDB,
     AttendanceCreate, AttendanceDB,
+    AttendeeMatch,
+    EventTimeline,
+    EventDeletionJob,
 )
-from ai_model import AISummaryDB
+from ai_model import AIBatchRequest, AISummaryDB, AISummaryPage
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import DuplicateKeyError
 from ai_integration import generate_recommendation
+import ai_batch
 import all_crud
-from authentication import get_password_hash, get_current_active_user
+import attendance_buffer
+import bulk_import
+import cache_bus
+import event_cleanup
+import export
+import live_feed
+import llm_guard
+from raw_bson import RawJSONResponse
+import matching
+import profiling
+import timeline
+import rate_limit
+from config import settings
+from authentication import get_password_hash, get_current_active_user, require_admin, user_or_ip
 
 router = APIRouter()
 
@@ -22,45 +46,17 @@ router = APIRouter()
 
 @router.post("/user/create_user")
 async def create_user_endpoint(user: UserForm):
-    # Validate uniqueness
-    '''if user.email:
-        email_user = await all_crud.get_user_by_email(user.email)
-        if email_user:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Email Already Used"
-            )'''
-    username_user = await all_crud.get_user_by_username(user.username)
-    if username_user:
+    # Username uniqueness is enforced by a unique index rather than a lookup,
+    # which was both an extra round trip and racy under concurrent signups.
+    # The blank profile is created on first read (all_crud.materialize_profile).
+    user.hashed_password = get_password_hash(user.hashed_password)
+    try:
+        await all_crud.create_user(user_data=user)
+    except DuplicateKeyError:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Username Already Taken"
         )
-    # Hash password and create user
-    user.hashed_password = get_password_hash(user.hashed_password)
-    new_user = await all_crud.create_user(user_data=user)
-    if not new_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User could not be created"
-        )
-    # Automatically create a blank profile for the new user.
-    profile_data = UserProfileCreate(
-        user_id=new_user["_id"],
-        major=None,
-        year=None,
-        interests=[],
-        badges=[],
-        personality_type=None
-    )
-    profile_dict = profile_data.model_dump(by_alias=True)
-    profile_dict["profile_created_at"] = datetime.utcnow()
-    new_profile = await all_crud.create_profile(profile_dict)
-    if not new_profile:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User created, but profile creation failed"
-        )
     return {"status": "Account and Profile Created Successfully"}
 
 
@@ -93,7 +89,6 @@ async def update_my_profile(
     # Ignore any user_id in profile_data; use current_user.id instead.
     update_dict = profile_data.model_dump(by_alias=True)
     update_dict["user_id"] = current_user.id  # enforce current user's id
-    update_dict["profile_created_at"] = datetime.utcnow()
     updated = await all_crud.update_profile(str(current_user.id), update_dict)
     if not updated:
         raise HTTPException(
@@ -101,6 +96,23 @@ async def update_my_profile(
     return updated
 
 
+@router.patch("/profiles/me", response_model=UserProfileDB)
+async def patch_my_profile(
+    changes: UserProfileUpdate,
+    current_user: Annotated[UserAuth, Depends(get_current_active_user)]
+):
+    """
+    Change only the fields present in the body. Sending values equal to the
+    stored ones writes nothing and invalidates nothing.
+    """
+    fields = changes.model_dump(exclude_unset=True)
+    for field in ("interests", "badges"):
+        if field in fields and fields[field] is None:
+            fields[field] = []
+    profile, _ = await all_crud.patch_profile(str(current_user.id), fields)
+    return profile
+
+
 # ---------------------------
 # Event Endpoints
 # ---------------------------
@@ -119,16 +131,46 @@ async def create_event_endpoint(
 
 @router.get("/events", response_model=List[EventDB])
 async def list_events():
-    events = await all_crud.get_all_events()
-    return events
+    events = await all_crud.get_all_events(raw=True)
+    return RawJSONResponse(events, EventDB)
 
 
 @router.get("/events/{event_id}", response_model=EventDB)
 async def get_event_endpoint(event_id: str):
-    event = await all_crud.get_event_by_id(event_id)
+    event = await all_crud.get_event_by_id(event_id, raw=True)
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
-    return event
+    return RawJSONResponse(event, EventDB)
+
+
+@router.get("/events/{event_id}/matches/me", response_model=List[AttendeeMatch])
+async def get_my_event_matches(
+    event_id: str,
+    current_user: Annotated[UserAuth, Depends(get_current_active_user)],
+    k: int = Query(10, ge=1, le=100),
+    metric: str = Query("jaccard", pattern="^(jaccard|weighted)$"),
+):
+    """
+    Suggest the attendees of an event the current user should meet, ranked by
+    similarity of interests, major and personality type.
+    """
+    return await matching.matches_for_user(
+        event_id, current_user.id, k=k, metric=metric)
+
+
+@router.get("/events/{event_id}/timeline", response_model=EventTimeline)
+async def get_event_timeline(
+    event_id: str,
+    bucket: str = Query("1m", pattern="^(1m|5m|1h)$"),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+):
+    """
+    Check-ins per minute, 5 minutes or hour for an event, read from the
+    incrementally maintained rollup. Empty buckets are omitted.
+    """
+    points = await timeline.get_timeline(event_id, bucket, start, end)
+    return {"event_id": event_id, "bucket": bucket, "points": points}
 
 
 @router.put("/events/{event_id}", response_model=EventDB)
@@ -155,7 +197,22 @@ async def delete_event_endpoint(
     if not success:
         raise HTTPException(
             status_code=404, detail="Event not found or delete failed")
-    return {"detail": "Event deleted"}
+    # attendances, summaries etc. are removed in the background; see
+    # GET /events/{event_id}/deletion for progress
+    job = await event_cleanup.schedule(event_id)
+    return {"detail": "Event deleted", "cleanup": job["status"]}
+
+
+@router.get("/events/{event_id}/deletion", response_model=EventDeletionJob)
+async def get_event_deletion(
+    event_id: str,
+    current_user: Annotated[UserAuth, Depends(get_current_active_user)]
+):
+    """Progress of the background removal of a deleted event's records."""
+    job = await event_cleanup.get_job(event_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="No deletion for this event")
+    return job
 
 # ---------------------------
 # Attendance Endpoints
@@ -172,6 +229,16 @@ async def record_attendance(
     att_dict["user_id"] = current_user.id
     if not att_dict.get("scanned_at"):
         att_dict["scanned_at"] = datetime.utcnow()
+    if attendance_buffer.buffer is not None:
+        try:
+            return AttendanceDB(**await attendance_buffer.buffer.submit(att_dict))
+        except attendance_buffer.BufferFullError:
+            raise HTTPException(
+                status_code=503, detail="Check-in backlog, try again shortly",
+                headers={"Retry-After": "1"})
+        except Exception:
+            raise HTTPException(
+                status_code=400, detail="Could not record attendance")
     new_att = await all_crud.create_attendance(att_dict)
     if not new_att:
         raise HTTPException(
@@ -184,8 +251,99 @@ async def list_attendance(
     user_id: Optional[str] = Query(None),
     event_id: Optional[str] = Query(None)
 ):
-    attendances = await all_crud.find_attendances(user_id, event_id)
-    return attendances
+    attendances = await all_crud.find_attendances(user_id, event_id, raw=True)
+    return RawJSONResponse(attendances, AttendanceDB)
+
+
+@router.websocket("/ws/events/{event_id}/checkins")
+async def checkin_feed(websocket: WebSocket, event_id: str):
+    """
+    Live check-ins for an event. The current attendee list comes first as one
+    or more {"type": "snapshot", "attendances": [...], "last": bool} messages
+    (the final one has "last": true), then one
+    {"type": "checkin", "attendance": {...}} message per new check-in.
+    Check-ins recorded while the snapshot is read can appear in both, so
+    clients should de-duplicate by "_id". A client that falls too far behind
+    is closed with code 1013 and should reconnect.
+    """
+    try:
+        ObjectId(event_id)
+    except InvalidId:
+        await websocket.close(code=1008, reason="Invalid event_id")
+        return
+    await websocket.accept()
+    # subscribe before reading the snapshot so no check-in falls in between
+    subscriber = live_feed.hub.subscribe(live_feed.checkin_topic(event_id))
+
+    async def send():
+        async for message in live_feed.snapshot_messages(event_id):
+            await websocket.send_text(message)
+        subscriber.start_limit()
+        while True:
+            message = await subscriber.queue.get()
+            if message is None:
+                await websocket.close(code=1013, reason="Client too slow")
+                return
+            await websocket.send_text(message)
+
+    sender = asyncio.create_task(send())
+    receiver = None
+    try:
+        # the client only ever sends to disconnect; wait for that or the sender
+        receiver = asyncio.create_task(websocket.receive())
+        while True:
+            done, _ = await asyncio.wait(
+                {sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if sender in done or receiver.result()["type"] == "websocket.disconnect":
+                break
+            receiver = asyncio.create_task(websocket.receive())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_feed.hub.unsubscribe(subscriber)
+        for task in (sender, receiver):
+            if task is not None:
+                task.cancel()
+    if sender.done() and not sender.cancelled():
+        # sending fails once the client has gone away; nothing left to do
+        sender.exception()
+
+
+# ---------------------------
+# Export Endpoints
+# ---------------------------
+@router.get("/export/attendance", dependencies=[Depends(require_admin)])
+async def export_attendance(
+    event_id: Optional[str] = Query(None),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(False),
+):
+    """
+    Stream attendance records (optionally for one event and/or scanned in
+    [start, end)) as NDJSON or CSV, optionally gzip-compressed.
+    """
+    cursor = all_crud.attendance_export_cursor(
+        event_id, start, end, export.ATTENDANCE_FIELDS)
+    return export.stream_response(
+        cursor, export.ATTENDANCE_FIELDS, format, gzip, "attendance")
+
+
+@router.get("/export/events", dependencies=[Depends(require_admin)])
+async def export_events(
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(False),
+):
+    """
+    Stream events (optionally dated in [start, end)) as NDJSON or CSV,
+    optionally gzip-compressed.
+    """
+    cursor = all_crud.event_export_cursor(start, end, export.EVENT_FIELDS)
+    return export.stream_response(
+        cursor, export.EVENT_FIELDS, format, gzip, "events")
 
 
 ####
@@ -206,18 +364,79 @@ async def get_ai_summary_for_event(event_id: str):
     return summary
 
 
-@router.post("/ai/request/{event_id}", response_model=AISummaryDB)
-async def create_ai_summary_for_event(event_id: str):
+@router.get("/ai/summaries/{event_id}", response_model=AISummaryPage,
+            response_model_exclude_none=True)
+async def list_ai_summaries_for_event(
+    event_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    include_bodies: bool = Query(False),
+):
+    """
+    List the AI summaries generated for an event, newest first.
+    Records carry request/response lengths and previews; pass include_bodies=true
+    (or fetch a single record) for the full text.
+
+    :param cursor: The next_cursor value of the previous page.
+    """
+    before = None
+    if cursor:
+        try:
+            created_at, last_id = cursor.split("_", 1)
+            before = (datetime.fromisoformat(created_at), ObjectId(last_id))
+        except (ValueError, InvalidId):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    items = await all_crud.list_ai_summaries(
+        event_id, limit=limit, before=before, include_bodies=include_bodies)
+    next_cursor = None
+    if len(items) == limit:
+        last = items[-1]
+        next_cursor = f"{last['created_at'].isoformat()}_{last['_id']}"
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/ai/summaries/{event_id}/{summary_id}", response_model=AISummaryDB)
+async def get_ai_summary_record(event_id: str, summary_id: str):
+    """
+    Retrieve one AI summary record with its full request and response text.
+    """
+    summary = await all_crud.get_ai_summary(event_id, summary_id)
+    if not summary:
+        raise HTTPException(status_code=404, detail="AI summary not found")
+    return summary
+
+
+@router.post(
+    "/ai/request/{event_id}",
+    response_model=AISummaryDB,
+    dependencies=[
+        Depends(rate_limit.rate_limit(
+            "ai_request", capacity=5, per_seconds=300, key_func=user_or_ip)),
+        Depends(rate_limit.llm_slots),
+    ],
+)
+async def create_ai_summary_for_event(event_id: str, response: Response):
     """
     Generate and save an AI summary record for the given event by invoking the AI integration logic.
     This endpoint calls the LLM to generate sentiment analysis and event recommendations based on user personas,
     then saves the prompt and LLM response to the database.
+    If the LLM is unavailable, the event's latest stored summary is returned
+    instead, marked with an `X-AI-Fallback: latest-summary` header.
 
     :param event_id: The event's ID as a string.
     :return: The saved AI summary record as a JSON object (with ObjectId fields converted to strings).
     """
     try:
         result = await generate_recommendation(event_id)
+    except llm_guard.LLMUnavailableError as e:
+        latest = await all_crud.get_latest_ai_summary_by_event(event_id)
+        if latest:
+            response.headers["X-AI-Fallback"] = "latest-summary"
+            return latest
+        retry_after = getattr(e, "retry_after", settings.LLM_BREAKER_RESET_SECONDS)
+        raise HTTPException(
+            status_code=503, detail=f"AI summarization unavailable: {e}",
+            headers={"Retry-After": str(round(retry_after))})
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"AI summarization failed: {e}")
@@ -227,3 +446,126 @@ async def create_ai_summary_for_event(event_id: str):
             status_code=500, detail="Failed to save AI summary record.")
 
     return result["saved_record"]
+
+
+# ---------------------------
+# Admin Endpoints
+# ---------------------------
+@router.get("/admin/cache/bus", dependencies=[Depends(require_admin)])
+async def get_cache_bus_stats():
+    """
+    Delivery statistics of the cross-worker cache invalidation bus for the
+    worker answering the request (lag is measured publish -> receive).
+    """
+    return {"worker_id": cache_bus.WORKER_ID, **cache_bus.stats}
+
+
+@router.get("/admin/rate_limits", dependencies=[Depends(require_admin)])
+async def get_rate_limit_metrics():
+    """
+    Requests shed by the rate limiter and the concurrency cap, per route, plus
+    the number currently in flight on this worker.
+    """
+    return rate_limit.metrics
+
+
+@router.get("/admin/llm", dependencies=[Depends(require_admin)])
+async def get_llm_stats():
+    """LLM call outcomes, hedging and circuit breaker state on this worker."""
+    return llm_guard.snapshot()
+
+
+@router.get("/admin/live_feed", dependencies=[Depends(require_admin)])
+async def get_live_feed_stats():
+    """Live check-in feed subscribers and deliveries on this worker."""
+    return {**live_feed.hub.stats,
+            "subscribers": live_feed.hub.subscriber_count(),
+            "events": len(live_feed.hub.topics)}
+
+
+@router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_request_profiles():
+    """Stored profiled requests, newest first."""
+    return await profiling.list_profiles()
+
+
+@router.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_request_profile(
+    profile_id: str,
+):
+    """Timing breakdown and the top functions by cumulative time."""
+    report = await profiling.get_profile(profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profiling.report_json(report)
+
+
+@router.get("/admin/profiles/{profile_id}/download", dependencies=[Depends(require_admin)])
+async def download_request_profile(
+    profile_id: str,
+):
+    """The full cProfile stats, loadable with pstats or snakeviz."""
+    report = await profiling.get_profile(profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(
+        content=report["stats"],
+        media_type="application/octet-stream",
+        headers={"Content-Disposition":
+                 f'attachment; filename="profile-{profile_id}.prof"'},
+    )
+
+
+@router.post("/admin/ai/batch", status_code=202, dependencies=[Depends(require_admin)])
+async def start_ai_batch(
+    batch: AIBatchRequest,
+):
+    """
+    Generate AI summaries for many events in the background, packing small
+    events into shared LLM requests. Poll GET /admin/ai/batch/{batch_id}.
+    """
+    event_ids = [str(e) for e in batch.event_ids]
+    if batch.date:
+        event_ids += await ai_batch.event_ids_on(
+            batch.date.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None))
+    if not event_ids:
+        raise HTTPException(status_code=400, detail="No events selected")
+    return await ai_batch.start(event_ids)
+
+
+@router.get("/admin/ai/batch/{batch_id}", dependencies=[Depends(require_admin)])
+async def get_ai_batch(
+    batch_id: str,
+):
+    progress = await ai_batch.get_batch(batch_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return progress
+
+
+@router.post("/admin/users/import", dependencies=[Depends(require_admin)])
+async def import_users_endpoint(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    import_id: Optional[str] = Query(None),
+):
+    """
+    Bulk-create users (and profiles) from a streamed CSV or NDJSON request body.
+    The format defaults to csv for a text/csv content type, otherwise ndjson.
+    Progress can be polled with GET /admin/users/import/{import_id} while the
+    upload is running; the final report is returned when it completes.
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if content_type.startswith("text/csv") else "ndjson"
+    return await bulk_import.import_users(request.stream(), format, import_id)
+
+
+@router.get("/admin/users/import/{import_id}", dependencies=[Depends(require_admin)])
+async def get_import_progress(
+    import_id: str,
+):
+    progress = await bulk_import.get_import(import_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return progress
@@ -1,3 +1,4 @@
+import logging
 from typing import List
 from ai_model import AISummaryCreate, AISummaryDB
 from mongodb import database, faked_database
@@ -7,15 +8,27 @@ from all_model import (
     AttendanceCreate, AttendanceDB,
 )
 from user_model import UserForm, UserAuth, UserAuthPass
+import vocabulary
+import cache_bus
+from text_codec import pack_fields, unpack_fields
+from raw_bson import raw_collection
 from bson.objectid import ObjectId
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
 
 # ---------------------------
 # Users CRUD
 # ---------------------------
 user_collection = database.users
 
+# False while existing duplicate usernames keep the unique index from being
+# built (see ensure_indexes); signup then falls back to a lookup.
+username_index_enforced = True
+
 
 async def get_user(user_id: str) -> UserAuth:
     result = await user_collection.find_one({"_id": ObjectId(user_id)})
@@ -39,11 +52,18 @@ async def get_user_by_email(email: str) -> UserAuthPass:
 
 
 async def create_user(user_data: UserForm):
+    """
+    Inserts a user in a single round trip. Username uniqueness is enforced by a
+    unique index, so a taken username raises DuplicateKeyError.
+    """
     # Use by_alias=True to ensure keys match Mongo's schema (i.e. "_id")
     user_dict = user_data.model_dump(by_alias=True)
+    if not username_index_enforced and await user_collection.find_one(
+            {"username": user_dict["username"]}, {"_id": 1}):
+        raise DuplicateKeyError("Username already taken", 11000)
     result = await user_collection.insert_one(user_dict)
-    new_user = await user_collection.find_one({"_id": result.inserted_id})
-    return new_user
+    user_dict["_id"] = result.inserted_id
+    return user_dict
 
 # ---------------------------
 # User Profiles CRUD
@@ -54,27 +74,104 @@ profile_collection = database.user_profiles
 async def get_profile_by_user_id(user_id: str) -> UserProfileDB:
     result = await profile_collection.find_one({"user_id": ObjectId(user_id)})
     if not result:
-        return False
+        result = await materialize_profile(user_id)
     return UserProfileDB(**result)
 
 
+async def materialize_profile(user_id: str) -> dict:
+    """
+    Profiles are not written at signup; the blank profile is created the first
+    time it is read. The upsert only inserts when no profile exists, so racing
+    readers end up with the same document.
+    """
+    blank = UserProfileCreate(user_id=ObjectId(user_id)).model_dump()
+    blank["profile_created_at"] = datetime.utcnow()
+    blank["interest_codes"] = []
+    del blank["user_id"]
+    try:
+        return await profile_collection.find_one_and_update(
+            {"user_id": ObjectId(user_id)},
+            {"$setOnInsert": blank},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # lost the race to a concurrent upsert; its document is there now
+        return await profile_collection.find_one({"user_id": ObjectId(user_id)})
+
+
 async def create_profile(profile_data: dict) -> UserProfileDB:
     # profile_data should include the required "profile_created_at" field.
+    profile_data["interest_codes"] = await vocabulary.intern(
+        profile_data.get("interests") or [])
     result = await profile_collection.insert_one(profile_data)
     new_profile = await profile_collection.find_one({"_id": result.inserted_id})
     return UserProfileDB(**new_profile)
 
 
+# Callbacks awaited after a profile is modified. Each one receives the user id
+# (as a string) and the fields that were written.
+profile_listeners: List[Callable[[str, dict], Awaitable[None]]] = []
+
+
+async def _notify_profile(user_id: str, changes: dict) -> None:
+    for listener in profile_listeners:
+        await listener(user_id, changes)
+
+
 async def update_profile(user_id: str, profile_data: dict) -> UserProfileDB:
+    if "interests" in profile_data:
+        profile_data["interest_codes"] = await vocabulary.intern(
+            profile_data["interests"] or [])
+    created_at = profile_data.pop("profile_created_at", None) or datetime.utcnow()
+    # upsert: the profile may not have been materialized yet
     result = await profile_collection.update_one(
         {"user_id": ObjectId(user_id)},
-        {"$set": profile_data}
+        {"$set": profile_data, "$setOnInsert": {"profile_created_at": created_at}},
+        upsert=True,
     )
-    if result.modified_count == 0:
-        return False
+    # saving unchanged data is not an error, but there is nothing to announce
+    if result.modified_count or result.upserted_id is not None:
+        await cache_bus.invalidate(f"profile:{user_id}")
+        await _notify_profile(user_id, profile_data)
     updated = await profile_collection.find_one({"user_id": ObjectId(user_id)})
     return UserProfileDB(**updated)
 
+
+async def patch_profile(user_id: str, changes: dict,
+                        retry: bool = True) -> Tuple[UserProfileDB, dict]:
+    """
+    Sets only the given fields, and only if at least one of them differs from
+    the stored value. The filter does the comparison, so a real change is one
+    round trip and a no-op save writes nothing.
+
+    :param changes: Field values to set (unset fields already left out).
+    :return: The updated profile and the fields whose values actually changed.
+    """
+    if not changes:
+        return await get_profile_by_user_id(user_id), {}
+    update = dict(changes)
+    if "interests" in changes:
+        update["interest_codes"] = await vocabulary.intern(changes["interests"] or [])
+    before = await profile_collection.find_one_and_update(
+        {"user_id": ObjectId(user_id),
+         "$or": [{field: {"$ne": value}} for field, value in changes.items()]},
+        {"$set": update},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if before is None:
+        # nothing differs, or there is no profile document yet
+        profile = await get_profile_by_user_id(user_id)
+        if not retry or all(getattr(profile, f) == v for f, v in changes.items()):
+            return profile, {}
+        # the blank profile was just materialized; apply the changes to it
+        return await patch_profile(user_id, changes, retry=False)
+
+    diff = {f: v for f, v in changes.items() if before.get(f) != v}
+    await cache_bus.invalidate(f"profile:{user_id}")
+    await _notify_profile(user_id, diff)
+    return UserProfileDB(**{**before, **update}), diff
+
 # ---------------------------
 # Events CRUD
 # ---------------------------
@@ -82,69 +179,264 @@ event_collection = database.events
 
 
 async def create_event(event_data: dict) -> EventDB:
+    event_data["tag_codes"] = await vocabulary.intern(event_data.get("tags") or [])
     result = await event_collection.insert_one(event_data)
     new_event = await event_collection.find_one({"_id": result.inserted_id})
     return EventDB(**new_event)
 
 
-async def get_all_events() -> List[EventDB]:
+# raw=True on the read functions below returns RawBSONDocuments instead of
+# models, for handlers that only pass documents through (see raw_bson.py).
+raw_event_collection = raw_collection(event_collection)
+
+
+async def get_all_events(raw: bool = False) -> List[EventDB]:
+    if raw:
+        return await raw_event_collection.find({}).to_list(length=1000)
     cursor = event_collection.find({})
     events = await cursor.to_list(length=1000)
     return [EventDB(**event) for event in events]
 
 
-async def get_event_by_id(event_id: str) -> EventDB:
-    result = await event_collection.find_one({"_id": ObjectId(event_id)})
+async def get_event_by_id(event_id: str, raw: bool = False) -> EventDB:
+    collection = raw_event_collection if raw else event_collection
+    result = await collection.find_one({"_id": ObjectId(event_id)})
     if not result:
         return False
-    return EventDB(**result)
+    return result if raw else EventDB(**result)
 
 
 async def update_event(event_id: str, event_data: dict) -> EventDB:
+    if "tags" in event_data:
+        event_data["tag_codes"] = await vocabulary.intern(event_data["tags"] or [])
     result = await event_collection.update_one(
         {"_id": ObjectId(event_id)},
         {"$set": event_data}
     )
     if result.modified_count == 0:
         return False
+    await cache_bus.invalidate(f"event:{event_id}")
     updated = await event_collection.find_one({"_id": ObjectId(event_id)})
     return EventDB(**updated)
 
 
 async def delete_event(event_id: str) -> bool:
     result = await event_collection.delete_one({"_id": ObjectId(event_id)})
-    return result.deleted_count == 1
+    if result.deleted_count != 1:
+        return False
+    await cache_bus.invalidate(f"event:{event_id}")
+    return True
 
 # ---------------------------
 # Attendances CRUD
 # ---------------------------
 attendance_collection = database.attendances
+raw_attendance_collection = raw_collection(attendance_collection)
+
+# Callbacks awaited after attendance records are written (cache invalidation,
+# rollups, ...). Each one receives the list of inserted documents.
+attendance_listeners: List[Callable[[List[dict]], Awaitable[None]]] = []
+
+
+async def _notify_attendance(docs: List[dict]) -> None:
+    """
+    Runs after the records are stored, so a failing listener is logged rather
+    than reported as a failed check-in (which the client would then retry).
+    """
+    if not docs:
+        return
+    # the new records ride along so every worker's live feed sees them
+    by_key: Dict[str, List[dict]] = {}
+    for doc in docs:
+        by_key.setdefault(f"attendance:{doc['event_id']}", []).append(doc)
+    try:
+        await cache_bus.invalidate(*by_key, data=by_key)
+    except Exception:
+        logger.exception("Attendance cache invalidation failed")
+    for listener in attendance_listeners:
+        try:
+            await listener(docs)
+        except Exception:
+            logger.exception("Attendance listener %s failed for %d records",
+                             listener.__name__, len(docs))
 
 
 async def create_attendance(att_data: dict) -> AttendanceDB:
     result = await attendance_collection.insert_one(att_data)
     new_att = await attendance_collection.find_one({"_id": result.inserted_id})
+    await _notify_attendance([new_att])
     return AttendanceDB(**new_att)
 
 
-async def find_attendances(user_id: Optional[str] = None, event_id: Optional[str] = None) -> List[AttendanceDB]:
+async def create_attendances(att_docs: List[dict]) -> None:
+    """
+    Inserts many attendance records with one unordered insert_many. Documents
+    that fail (e.g. duplicate _id) do not stop the rest; the BulkWriteError is
+    re-raised after listeners have been notified about the ones that succeeded.
+    """
+    try:
+        await attendance_collection.insert_many(att_docs, ordered=False)
+    except BulkWriteError as e:
+        failed = {err["index"] for err in e.details.get("writeErrors", [])}
+        await _notify_attendance(
+            [doc for i, doc in enumerate(att_docs) if i not in failed])
+        raise
+    await _notify_attendance(att_docs)
+
+
+async def find_attendances(user_id: Optional[str] = None, event_id: Optional[str] = None,
+                           raw: bool = False) -> List[AttendanceDB]:
     query = {}
     if user_id:
         query["user_id"] = ObjectId(user_id)
     if event_id:
         query["event_id"] = ObjectId(event_id)
+    if raw:
+        return await raw_attendance_collection.find(query).to_list(length=1000)
     cursor = attendance_collection.find(query)
     attendances = await cursor.to_list(length=1000)
     return [AttendanceDB(**att) for att in attendances]
 
+
+# Exports read in large batches; the cursor is consumed while streaming.
+EXPORT_BATCH_SIZE = 2000
+
+
+def _date_range(field: str, start: Optional[datetime], end: Optional[datetime]) -> dict:
+    if not start and not end:
+        return {}
+    bounds = {}
+    if start:
+        bounds["$gte"] = start
+    if end:
+        bounds["$lt"] = end
+    return {field: bounds}
+
+
+def attendance_export_cursor(
+    event_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    fields: Optional[List[str]] = None,
+):
+    """
+    Returns an unconsumed cursor over attendance records for streaming exports,
+    filtered by event and by scanned_at in [start, end).
+    """
+    query = _date_range("scanned_at", start, end)
+    if event_id:
+        query["event_id"] = ObjectId(event_id)
+    return attendance_collection.find(query, fields).batch_size(EXPORT_BATCH_SIZE)
+
+
+def event_export_cursor(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    fields: Optional[List[str]] = None,
+):
+    """
+    Returns an unconsumed cursor over events for streaming exports, filtered by
+    event date in [start, end).
+    """
+    query = _date_range("date", start, end)
+    return event_collection.find(query, fields).batch_size(EXPORT_BATCH_SIZE)
+
+
+ATTENDEE_PROFILE_FIELDS = {"_id": 0, "user_id": 1, "major": 1, "year": 1,
+                           "interests": 1, "interest_codes": 1, "personality_type": 1}
+
+
+async def get_event_attendee_profiles(event_id: str) -> List[Dict[str, Any]]:
+    """
+    Retrieves the descriptive profile fields of every user who attended the given
+    event in two queries (distinct attendee ids, then one $in over user_profiles).
+
+    :param event_id: The event's ID as a string.
+    :return: A list of dictionaries with user_id, major, year, interests,
+             interest_codes and personality_type.
+    """
+    user_ids = await attendance_collection.distinct(
+        "user_id", {"event_id": ObjectId(event_id)})
+    if not user_ids:
+        return []
+    cursor = profile_collection.find(
+        {"user_id": {"$in": user_ids}}, ATTENDEE_PROFILE_FIELDS)
+    return await cursor.to_list(length=None)
+
+
+async def get_profile_matching_fields(user_id: str) -> Optional[Dict[str, Any]]:
+    """
+    The same fields as get_event_attendee_profiles for one user, read as stored
+    (including interest_codes). Unlike get_profile_by_user_id this does not
+    materialize a missing profile.
+
+    :return: The dictionary, or None if the user has no profile document.
+    """
+    return await profile_collection.find_one(
+        {"user_id": ObjectId(user_id)}, ATTENDEE_PROFILE_FIELDS)
+
 # AI RESOURCE
 
 
+# Materialized persona list per event, so building a prompt is one document
+# read. Snapshots are updated incrementally by the attendance and profile
+# listeners below and built from scratch the first time an event is read;
+# `python personas.py check|rebuild` repairs drift.
+event_persona_collection = database.event_personas
+
+PERSONA_FIELDS = ("major", "year", "interests", "personality_type")
+# Keeps a snapshot far below the 16 MB document limit. Larger events are
+# marked `too_large` and their personas are built from the live join instead.
+MAX_SNAPSHOT_PERSONAS = 20000
+# check-ins whose _id is this much older than the start of a rebuild are
+# assumed to be in it (covers clock skew and write-behind delay)
+REBUILD_MARGIN = timedelta(seconds=30)
+
+
+def _persona(user_id: ObjectId, profile: Optional[dict]) -> Dict[str, Any]:
+    # attendees without a profile document get the blank profile's values
+    profile = profile or UserProfileCreate(user_id=user_id).model_dump()
+    persona = {"user_id": user_id}
+    persona.update({field: profile.get(field) for field in PERSONA_FIELDS})
+    return persona
+
+
+async def build_event_personas(event_id: str) -> List[Dict[str, Any]]:
+    """
+    Computes an event's persona list from attendances and user_profiles, one
+    entry (with user_id) per distinct attendee.
+    """
+    user_ids = await attendance_collection.distinct(
+        "user_id", {"event_id": ObjectId(event_id)})
+    profiles = {p["user_id"]: p for p in await get_event_attendee_profiles(event_id)}
+    return [_persona(uid, profiles.get(uid)) for uid in user_ids]
+
+
+async def rebuild_event_personas(event_id: str) -> List[Dict[str, Any]]:
+    """Replaces an event's persona snapshot with a freshly built one."""
+    started = datetime.utcnow()
+    personas = await build_event_personas(event_id)
+    snapshot = {"personas": personas, "rebuilt_at": datetime.utcnow()}
+    if len(personas) > MAX_SNAPSHOT_PERSONAS:
+        snapshot = {"personas": [], "too_large": True, "rebuilt_at": snapshot["rebuilt_at"]}
+    await event_persona_collection.replace_one(
+        {"_id": ObjectId(event_id)}, snapshot, upsert=True)
+    if not snapshot.get("too_large"):
+        # a check-in written during the build may be missing from it, and its
+        # listener found no snapshot or pushed to the one just replaced
+        recent = await attendance_collection.find(
+            {"event_id": ObjectId(event_id),
+             "_id": {"$gte": ObjectId.from_datetime(started - REBUILD_MARGIN)}},
+            {"event_id": 1, "user_id": 1},
+        ).to_list(length=None)
+        await _add_personas(recent)
+    return personas
+
+
 async def get_event_personas(event_id: str) -> List[Dict[str, Any]]:
     """
-    Retrieves descriptive user profiles for all users who attended the given event.
-    It uses the attendances table to fetch user IDs linked to the event, then queries 
-    user_profiles for each user, returning only the descriptive attributes:
+    Retrieves descriptive user profiles for all users who attended the given
+    event from its persona snapshot, returning only the descriptive attributes:
         - major
         - year
         - interests
@@ -153,38 +445,72 @@ async def get_event_personas(event_id: str) -> List[Dict[str, Any]]:
     :param event_id: The event's ID as a string.
     :return: A list of dictionaries with the descriptive data.
     """
-    # Retrieve attendance records for the specified event.
-    attendances = await find_attendances(event_id=event_id)
-    # Extract unique user IDs using attribute access.
-    user_ids = {str(att.user_id) for att in attendances}
-
-    personas: List[Dict[str, Any]] = []
-    for uid in user_ids:
-        profile = await get_profile_by_user_id(uid)
-        if profile:
-            # Construct a persona dictionary using only descriptive fields.
-            persona = {
-                "major": profile.major,
-                "year": profile.year,
-                "interests": profile.interests,
-                "personality_type": profile.personality_type,
-            }
-            personas.append(persona)
-
-    return personas
+    snapshot = await event_persona_collection.find_one({"_id": ObjectId(event_id)})
+    if snapshot is None or len(snapshot["personas"]) > MAX_SNAPSHOT_PERSONAS:
+        # missing, or grown past the cap by the listener: (re)build it
+        personas = await rebuild_event_personas(event_id)
+    elif snapshot.get("too_large"):
+        personas = await build_event_personas(event_id)
+    else:
+        personas = snapshot["personas"]
+    return [{field: p.get(field) for field in PERSONA_FIELDS} for p in personas]
+
+
+async def _add_personas(docs: List[dict]) -> None:
+    """Attendance listener: add new attendees to existing snapshots."""
+    attendees: Dict[ObjectId, set] = {}
+    for doc in docs:
+        attendees.setdefault(doc["event_id"], set()).add(doc["user_id"])
+    # events without a snapshot (built on first read) or marked too large
+    # have nothing to update, so most check-ins stop at this query
+    snapshots = await event_persona_collection.distinct(
+        "_id", {"_id": {"$in": list(attendees)}, "too_large": {"$ne": True}})
+    if not snapshots:
+        return
+    user_ids = list(set().union(*(attendees[e] for e in snapshots)))
+    profiles = {p["user_id"]: p async for p in profile_collection.find(
+        {"user_id": {"$in": user_ids}})}
+    # a full snapshot stops growing at one past the cap; the next read
+    # replaces it with a too_large marker
+    await event_persona_collection.bulk_write([
+        UpdateOne({"_id": event_id, "personas.user_id": {"$ne": user_id},
+                   f"personas.{MAX_SNAPSHOT_PERSONAS}": {"$exists": False}},
+                  {"$push": {"personas": _persona(user_id, profiles.get(user_id))}})
+        for event_id in snapshots for user_id in attendees[event_id]
+    ], ordered=False)
+
+
+async def _update_personas(user_id: str, changes: dict) -> None:
+    """Profile listener: update the user's entry in every event they attended."""
+    fields = {f"personas.$.{field}": changes[field]
+              for field in PERSONA_FIELDS if field in changes}
+    if not fields:
+        return
+    # a user appears at most once per snapshot, so the positional $ suffices
+    await event_persona_collection.update_many(
+        {"personas.user_id": ObjectId(user_id)}, {"$set": fields})
+
+
+attendance_listeners.append(_add_personas)
+profile_listeners.append(_update_personas)
 
 
 # Create a new collection for AI summaries.
 ai_summary_collection = faked_database.ai_summaries
 
+# Large prompt/response bodies are stored compressed (see text_codec) together
+# with their length and a preview; readers get plain strings back.
+AI_SUMMARY_TEXT_FIELDS = ("request", "response")
+AI_SUMMARY_PREVIEW_CHARS = 200
+
 
 async def create_ai_summary(summary_data: dict) -> AISummaryDB:
     """
     Inserts an AI summary record into the collection and returns the document.
     """
-    result = await ai_summary_collection.insert_one(summary_data)
-    new_summary = await ai_summary_collection.find_one({"_id": result.inserted_id})
-    return AISummaryDB(**new_summary)
+    result = await ai_summary_collection.insert_one(pack_fields(
+        summary_data, AI_SUMMARY_TEXT_FIELDS, AI_SUMMARY_PREVIEW_CHARS))
+    return AISummaryDB(**summary_data, _id=result.inserted_id)
 
 
 async def get_latest_ai_summary_by_event(event_id: str) -> Optional[AISummaryDB]:
@@ -199,7 +525,7 @@ async def get_latest_ai_summary_by_event(event_id: str) -> Optional[AISummaryDB]
     document = await ai_summary_collection.find_one(query, sort=[("created_at", -1)])
     if not document:
         return None
-    return AISummaryDB(**document)
+    return AISummaryDB(**unpack_fields(document, AI_SUMMARY_TEXT_FIELDS))
 
 
 async def get_ai_summary_by_event(event_id: str) -> List[AISummaryDB]:
@@ -207,6 +533,97 @@ async def get_ai_summary_by_event(event_id: str) -> List[AISummaryDB]:
     Retrieves all AI summary records for a given event.
     """
     query = {"event_id": ObjectId(event_id)}
-    cursor = ai_summary_collection.find_one(query)
+    cursor = ai_summary_collection.find(query)
     summaries = await cursor.to_list(length=1000)
-    return [AISummaryDB(**s) for s in summaries]
+    return [AISummaryDB(**unpack_fields(s, AI_SUMMARY_TEXT_FIELDS)) for s in summaries]
+
+
+async def get_ai_summary(event_id: str, summary_id: str) -> Optional[AISummaryDB]:
+    document = await ai_summary_collection.find_one(
+        {"_id": ObjectId(summary_id), "event_id": ObjectId(event_id)})
+    if not document:
+        return None
+    return AISummaryDB(**unpack_fields(document, AI_SUMMARY_TEXT_FIELDS))
+
+
+async def list_ai_summaries(
+    event_id: str,
+    limit: int = 20,
+    before: Optional[Tuple[datetime, ObjectId]] = None,
+    include_bodies: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Retrieves a page of an event's AI summaries, newest first, using keyset
+    pagination on (created_at, _id).
+
+    The prompt and response bodies are replaced by their stored lengths and
+    previews (computed server side for records written before compression), so
+    only a few hundred bytes per record leave the database and nothing is
+    decompressed unless `include_bodies` is set.
+
+    :param event_id: The event's ID as a string.
+    :param limit: Maximum number of records to return.
+    :param before: (created_at, _id) of the last record of the previous page.
+    :param include_bodies: Also return the full request/response text.
+    :return: A list of dictionaries matching AISummaryListItem.
+    """
+    match: Dict[str, Any] = {"event_id": ObjectId(event_id)}
+    if before:
+        created_at, last_id = before
+        match["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": last_id}},
+        ]
+    projection: Dict[str, Any] = {"event_id": 1, "created_at": 1}
+    for field in AI_SUMMARY_TEXT_FIELDS:
+        is_plain = {"$eq": [{"$type": f"${field}"}, "string"]}
+        projection[f"{field}_length"] = {"$cond": [
+            is_plain, {"$strLenCP": f"${field}"}, f"${field}_length"]}
+        projection[f"{field}_preview"] = {"$cond": [
+            is_plain, {"$substrCP": [f"${field}", 0, AI_SUMMARY_PREVIEW_CHARS]},
+            f"${field}_preview"]}
+        if include_bodies:
+            projection[field] = 1
+    cursor = ai_summary_collection.aggregate([
+        {"$match": match},
+        {"$sort": {"created_at": -1, "_id": -1}},
+        {"$limit": limit},
+        {"$project": projection},
+    ])
+    summaries = await cursor.to_list(length=limit)
+    return [unpack_fields(s, AI_SUMMARY_TEXT_FIELDS) for s in summaries]
+
+
+# ---------------------------
+# Indexes
+# ---------------------------
+async def duplicate_values(collection, field: str) -> List[Dict[str, Any]]:
+    """Values of `field` shared by several documents, as {"_id": value, "ids": [...]}."""
+    cursor = collection.aggregate([
+        {"$group": {"_id": f"${field}", "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ], allowDiskUse=True)
+    return await cursor.to_list(length=None)
+
+
+async def ensure_indexes() -> None:
+    global username_index_enforced
+    try:
+        await user_collection.create_index("username", unique=True)
+        username_index_enforced = True
+    except OperationFailure as e:
+        if e.code != 11000:
+            raise
+        # accounts created by the old check-then-insert signup race; start
+        # anyway and leave the clean-up to `python dedupe_users.py`
+        duplicates = [d["_id"] for d in await duplicate_values(user_collection, "username")]
+        logger.warning(
+            "Unique username index not created: %d usernames are taken more than "
+            "once (%s). Run `python dedupe_users.py` to fix them.",
+            len(duplicates), ", ".join(map(repr, duplicates[:5])))
+        username_index_enforced = False
+    await profile_collection.create_index("user_id", unique=True)
+    await attendance_collection.create_index("event_id")
+    await event_persona_collection.create_index("personas.user_id")
+    await ai_summary_collection.create_index(
+        [("event_id", 1), ("created_at", -1), ("_id", -1)])
@@ -1,7 +1,7 @@
 # custom ObjectId type with __get_pydantic_core_schema__
 from pyobjectid import PyObjectId
 from bson import ObjectId
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime, date
 from pydantic import BaseModel, Field
 
@@ -29,6 +29,15 @@ class UserProfileCreate(BaseModel):
         json_encoders = {ObjectId: str}
 
 
+class UserProfileUpdate(BaseModel):
+    # PATCH body: only the fields that are sent are changed
+    major: Optional[str] = None
+    year: Optional[int] = None
+    interests: Optional[List[str]] = None
+    badges: Optional[List[str]] = None
+    personality_type: Optional[str] = None
+
+
 class UserProfileDB(UserProfileCreate):
     id: PyObjectId = Field(..., alias="_id")
     profile_created_at: datetime = Field(...)
@@ -86,3 +95,55 @@ class AttendanceDB(AttendanceCreate):
         arbitrary_types_allowed = True
         from_attributes = True
         json_encoders = {ObjectId: str}
+
+
+# ---------------------------
+# Attendee Matching
+# ---------------------------
+class AttendeeMatch(BaseModel):
+    user_id: PyObjectId
+    score: float
+    shared_interests: List[str] = []
+    same_major: bool = False
+    same_personality_type: bool = False
+
+    class Config:
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
+
+# ---------------------------
+# Check-in Timeline
+# ---------------------------
+class TimelinePoint(BaseModel):
+    start: datetime
+    count: int
+
+
+class EventTimeline(BaseModel):
+    event_id: PyObjectId
+    bucket: str
+    points: List[TimelinePoint] = []
+
+    class Config:
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
+
+# ---------------------------
+# Event Deletion
+# ---------------------------
+class EventDeletionJob(BaseModel):
+    event_id: PyObjectId = Field(..., alias="_id")
+    status: str
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    # documents removed so far, per dependent collection
+    deleted: Dict[str, int] = {}
+    error: Optional[str] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+        populate_by_name = True
+        json_encoders = {ObjectId: str}
@@ -0,0 +1,155 @@
+"""
+Optional write-behind buffering for attendance check-ins.
+
+With ATTENDANCE_WRITE_BEHIND enabled, `POST /attendance` hands its document to
+`buffer.submit()` instead of doing its own insert_one. The buffer is written
+with a single unordered insert_many every ATTENDANCE_FLUSH_INTERVAL_MS or as
+soon as ATTENDANCE_FLUSH_MAX_RECORDS are waiting, whichever comes first.
+
+ATTENDANCE_DURABILITY controls when `submit()` returns:
+    "flush"   - after the batch holding the record has been written (default)
+    "enqueue" - as soon as the record is buffered; records still buffered
+                when the process dies are lost
+
+When ATTENDANCE_BUFFER_MAX_RECORDS are waiting, `submit()` blocks for up to
+ATTENDANCE_BUFFER_WAIT_MS before giving up with BufferFullError.
+"""
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+import all_crud
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BufferFullError(Exception):
+    pass
+
+
+class AttendanceWriteBuffer:
+    def __init__(
+        self,
+        flush_interval_ms: int,
+        flush_max_records: int,
+        max_records: int,
+        durability: str = "flush",
+        max_wait_ms: int = 1000,
+    ):
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_max_records = flush_max_records
+        self.max_records = max_records
+        self.wait_for_flush = durability == "flush"
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[Tuple[dict, Optional[asyncio.Future]]] = []
+        self._wakeup = asyncio.Event()
+        self._has_space = asyncio.Event()
+        self._has_space.set()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._flush_lock = asyncio.Lock()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the periodic flusher and write out everything still buffered."""
+        if self._task:
+            # let a batch that is being written finish (and notify listeners)
+            # rather than cancelling it halfway
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def submit(self, att_data: dict) -> dict:
+        """
+        Buffer an attendance document for insertion. Its _id is assigned here so
+        the caller can respond without reading the record back.
+        """
+        while len(self._pending) >= self.max_records:
+            self._has_space.clear()
+            try:
+                await asyncio.wait_for(self._has_space.wait(), self.max_wait)
+            except asyncio.TimeoutError:
+                raise BufferFullError("Attendance write buffer is full")
+
+        att_data.setdefault("_id", ObjectId())
+        done = asyncio.get_running_loop().create_future() if self.wait_for_flush else None
+        self._pending.append((att_data, done))
+        if len(self._pending) >= self.flush_max_records:
+            self._wakeup.set()
+        if done:
+            await done
+        return att_data
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Attendance buffer flush failed")
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.flush_max_records]
+                del self._pending[:self.flush_max_records]
+                self._has_space.set()
+                # the batch has left _pending; finish it even if we are cancelled
+                await asyncio.shield(self._write(batch))
+
+    async def _write(self, batch: List[Tuple[dict, Optional[asyncio.Future]]]) -> None:
+        failed = {}
+        try:
+            await all_crud.create_attendances([doc for doc, _ in batch])
+        except BulkWriteError as e:
+            failed = {err["index"]: err.get("errmsg", "write failed")
+                      for err in e.details.get("writeErrors", [])}
+        except Exception as e:
+            # only the insert itself can fail here; listener errors are logged
+            # by all_crud and do not affect records that were stored
+            failed = {i: str(e) for i in range(len(batch))}
+        if failed and not self.wait_for_flush:
+            logger.error("Attendance buffer dropped %d of %d records: %s",
+                         len(failed), len(batch), next(iter(failed.values())))
+        for i, (_, done) in enumerate(batch):
+            if done is None or done.done():
+                continue
+            if i in failed:
+                done.set_exception(Exception(failed[i]))
+            else:
+                done.set_result(None)
+
+
+# Created at startup when ATTENDANCE_WRITE_BEHIND is enabled.
+buffer: Optional[AttendanceWriteBuffer] = None
+
+
+def start() -> None:
+    global buffer
+    buffer = AttendanceWriteBuffer(
+        flush_interval_ms=settings.ATTENDANCE_FLUSH_INTERVAL_MS,
+        flush_max_records=settings.ATTENDANCE_FLUSH_MAX_RECORDS,
+        max_records=settings.ATTENDANCE_BUFFER_MAX_RECORDS,
+        durability=settings.ATTENDANCE_DURABILITY,
+        max_wait_ms=settings.ATTENDANCE_BUFFER_WAIT_MS,
+    )
+    buffer.start()
+
+
+async def stop() -> None:
+    global buffer
+    if buffer is not None:
+        await buffer.close()
+        buffer = None
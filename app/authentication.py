@@ -5,7 +5,7 @@ from datetime import datetime, timedelta
 from config import settings
 from user_model import UserAuth, UserAuthPass
 
-from fastapi import Depends, HTTPException, status, APIRouter
+from fastapi import Depends, HTTPException, Request, status, APIRouter
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
 from pydantic import BaseModel
@@ -13,6 +13,8 @@ from pydantic import BaseModel
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
+from rate_limit import rate_limit, bcrypt_slots, client_ip
+
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRES_MINUTES = 30
 
@@ -91,17 +93,44 @@ async def get_current_active_user(current_user: Annotated[UserAuth, Depends(get_
     return current_user
 
 
+def user_or_ip(request: Request) -> str:
+    """Rate limit key: the user id of a valid bearer token, else the client IP."""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY,
+                                 algorithms=[ALGORITHM])
+            if payload.get("sub"):
+                return f"user:{payload['sub']}"
+        except JWTError:
+            pass
+    return client_ip(request)
+
+
 async def is_admin(current_user: Annotated[UserAuth, Depends(get_current_active_user)]) -> bool:
     if current_user.is_admin:
         return True
     return False
 
 
+async def require_admin(admin: Annotated[bool, Depends(is_admin)]) -> None:
+    """Route dependency: 403 unless the current user is an admin."""
+    if not admin:
+        raise HTTPException(
+            status_code=403, detail="Admin privileges required")
+
+
 router = APIRouter()
 
 
 # create access token for session = 30 minutes
-@router.post("/auth/token", response_model=Token)
+@router.post(
+    "/auth/token",
+    response_model=Token,
+    # bcrypt is deliberately slow; keep one client from monopolizing a worker
+    dependencies=[Depends(rate_limit("auth_token", capacity=10, per_seconds=60)),
+                  Depends(bcrypt_slots)],
+)
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
     ''' INFO ON /api/token Fetch Params
 
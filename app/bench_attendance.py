@@ -0,0 +1,79 @@
+"""
+Check-in surge benchmark: direct insert_one vs. write-behind batching.
+
+Fires CHECKINS concurrent calls at the `record_attendance` handler (bypassing
+HTTP) against the database in MONGO_URI and reports handler p50/p99 latency,
+check-ins/sec and Mongo operations/sec (from serverStatus opcounters, so run it
+against a database nobody else is using). The records are written under a
+throwaway event id and removed afterwards.
+
+    python bench_attendance.py [checkins] [concurrency]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+from bson import ObjectId
+
+import all_api
+import all_crud
+import attendance_buffer
+from all_model import AttendanceCreate
+from mongodb import client
+from user_model import UserAuth
+
+
+async def _opcount() -> int:
+    status = await client.admin.command("serverStatus")
+    return sum(status["opcounters"].values())
+
+
+async def run(label: str, checkins: int, concurrency: int) -> Dict[str, float]:
+    event_id = ObjectId()
+    users = [UserAuth(_id=ObjectId()) for _ in range(checkins)]
+    latencies: List[float] = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def checkin(user: UserAuth):
+        async with slots:
+            start = time.perf_counter()
+            await all_api.record_attendance(AttendanceCreate(
+                user_id=user.id, event_id=event_id), current_user=user)
+            latencies.append(time.perf_counter() - start)
+
+    ops_before = await _opcount()
+    start = time.perf_counter()
+    await asyncio.gather(*(checkin(u) for u in users))
+    if attendance_buffer.buffer is not None:
+        await attendance_buffer.buffer.flush()
+    elapsed = time.perf_counter() - start
+    ops = await _opcount() - ops_before
+
+    await all_crud.attendance_collection.delete_many({"event_id": event_id})
+    latencies.sort()
+    result = {
+        "checkins/s": checkins / elapsed,
+        "mongo ops/s": ops / elapsed,
+        "p50 ms": statistics.median(latencies) * 1000,
+        "p99 ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+    print(f"{label:<24}" + "  ".join(f"{k} {v:9.1f}" for k, v in result.items()))
+    return result
+
+
+async def main(checkins: int, concurrency: int):
+    await run("direct insert_one", checkins, concurrency)
+    for durability in ("flush", "enqueue"):
+        attendance_buffer.buffer = attendance_buffer.AttendanceWriteBuffer(
+            flush_interval_ms=50, flush_max_records=500,
+            max_records=10000, durability=durability)
+        attendance_buffer.buffer.start()
+        await run(f"write-behind ({durability})", checkins, concurrency)
+        await attendance_buffer.stop()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    asyncio.run(main(*(args + [5000, 500][len(args):])))
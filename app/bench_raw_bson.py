@@ -0,0 +1,96 @@
+"""
+CPU and memory per document: model read path vs. raw-BSON read path.
+
+Runs offline on synthetic BSON (no database needed). The model path mirrors
+what GET /events did before: decode to dict, build EventDB in the CRUD layer,
+then FastAPI validates against response_model=List[EventDB] and serializes it.
+The raw path decodes with raw_bson's CodecOptions and writes JSON with its
+typed decoder. RawBSONDocument as the document class is measured as well.
+All paths must produce the same JSON, which is checked first.
+
+    python bench_raw_bson.py [documents]
+"""
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import List
+
+import bson
+from bson import ObjectId
+from pydantic import TypeAdapter
+
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+from all_model import EventDB
+from raw_bson import RAW_CODEC_OPTIONS, decoder_for
+
+
+def make_batch(n: int) -> bytes:
+    now = datetime.utcnow().replace(microsecond=0)
+    return b"".join(bson.encode({
+        "_id": ObjectId(),
+        "name": f"Event {i}",
+        "description": "Hackathon kickoff designed to stimulate collaboration. " * 3,
+        "date": now,
+        "location": "Main Hall",
+        "tags": ["hackathon", "networking", f"tag{i % 50}"],
+        "tag_codes": [1, 2, i % 50],
+        "created_at": now,
+    }) for i in range(n))
+
+
+adapter = TypeAdapter(List[EventDB])
+
+
+def model_path(data: bytes) -> bytes:
+    events = [EventDB(**doc) for doc in bson.decode_all(data)]
+    # FastAPI dumps returned models before validating them against response_model
+    value = adapter.validate_python(
+        [event.model_dump(by_alias=True) for event in events])
+    return json.dumps(adapter.dump_python(value, mode="json", by_alias=True),
+                      separators=(",", ":")).encode("utf-8")
+
+
+def raw_path(data: bytes) -> bytes:
+    docs = bson.decode_all(data, RAW_CODEC_OPTIONS)
+    return decoder_for(EventDB).encode_many(docs).encode("utf-8")
+
+
+RAW_DOCUMENT_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+
+def raw_document_path(data: bytes) -> bytes:
+    def default(value):
+        return value.isoformat() if isinstance(value, datetime) else str(value)
+    fields = decoder_for(EventDB).fields
+    docs = bson.decode_all(data, RAW_DOCUMENT_OPTIONS)
+    return json.dumps([{k: doc.get(k, d) for k, d in fields} for doc in docs],
+                      default=default, separators=(",", ":")).encode("utf-8")
+
+
+def measure(label: str, fn, data: bytes, n: int, rounds: int = 5) -> None:
+    fn(data)  # warm up
+    cpu = time.process_time()
+    for _ in range(rounds):
+        fn(data)
+    cpu_us = (time.process_time() - cpu) / (rounds * n) * 1e6
+
+    tracemalloc.start()
+    fn(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<16} {cpu_us:8.2f} us/doc   peak {peak / n:8.1f} B/doc")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    data = make_batch(n)
+    expected = json.loads(model_path(data))
+    for path in (raw_path, raw_document_path):
+        assert json.loads(path(data)) == expected, f"{path.__name__} output differs"
+    measure("model path", model_path, data, n)
+    measure("raw path", raw_path, data, n)
+    measure("RawBSONDocument", raw_document_path, data, n)
@@ -0,0 +1,269 @@
+"""
+Streaming bulk import of users (and optionally their profiles) for cohort
+onboarding.
+
+The upload is parsed line by line as it arrives, either as NDJSON (one object
+per line) or CSV with a header row (one record per line). Rows are collected
+into batches of BATCH_SIZE: passwords are bcrypt-hashed in a process pool, users
+go in with one unordered insert_many (duplicate usernames are reported per row
+instead of aborting the batch) and the profiles of the users that were created
+follow with another. Only one batch is held in memory at a time and at most
+MAX_REPORTED_ERRORS row errors are kept, so memory stays flat for any file size.
+The progress report is saved to `user_imports` after every batch, so it can be
+polled from any worker.
+
+Recognised fields: username, password (required), email, name, major, year,
+interests, badges, personality_type. In CSV, list fields are ';'-separated.
+"""
+import asyncio
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+import all_crud
+import vocabulary
+from all_model import UserProfileCreate
+from authentication import pwd_context
+from config import settings
+from mongodb import database
+from user_model import UserForm
+
+BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+MAX_LINE_BYTES = 1024 * 1024
+
+PROFILE_FIELDS = ("major", "year", "interests", "badges", "personality_type")
+LIST_FIELDS = ("interests", "badges")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+# progress reports, keyed by import_id
+import_collection = database.user_imports
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """Runs in a pool worker process."""
+    return [pwd_context.hash(p) for p in passwords]
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.IMPORT_HASH_WORKERS)
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+async def _hash_all(passwords: List[str]) -> List[str]:
+    loop = asyncio.get_running_loop()
+    workers = settings.IMPORT_HASH_WORKERS
+    size = max(1, -(-len(passwords) // workers))
+    chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+    hashed = await asyncio.gather(
+        *(loop.run_in_executor(_get_pool(), hash_passwords, c) for c in chunks))
+    return [h for chunk in hashed for h in chunk]
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        if len(pending) > MAX_LINE_BYTES:
+            raise ValueError("Line too long; expected one record per line")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if pending:
+        yield pending.decode("utf-8-sig").rstrip("\r")
+
+
+async def iter_rows(
+    chunks: AsyncIterator[bytes], fmt: str
+) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Yield (row number, parsed row or None, error or None) per non-blank line."""
+    header: Optional[List[str]] = None
+    row_no = 0
+    async for line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [h.strip().lower() for h in values]
+                continue
+            row_no += 1
+            row = {k: v for k, v in zip(header, values) if v != ""}
+            for field in LIST_FIELDS:
+                if field in row:
+                    row[field] = [v.strip() for v in row[field].split(";") if v.strip()]
+            yield row_no, row, None
+        else:
+            row_no += 1
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield row_no, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield row_no, None, "Expected a JSON object"
+                continue
+            yield row_no, row, None
+
+
+async def _publish(progress: Dict[str, Any]) -> None:
+    await import_collection.replace_one(
+        {"_id": progress["import_id"]}, progress, upsert=True)
+
+
+async def get_import(import_id: str) -> Optional[Dict[str, Any]]:
+    return await import_collection.find_one({"_id": import_id}, {"_id": 0})
+
+
+def _error(progress: Dict[str, Any], row_no: int, message: str) -> None:
+    progress["failed"] += 1
+    if len(progress["errors"]) < MAX_REPORTED_ERRORS:
+        progress["errors"].append({"row": row_no, "error": message})
+    else:
+        progress["errors_truncated"] = True
+
+
+async def _drop_taken_usernames(batch: List[Tuple[int, UserForm, Optional[dict]]],
+                                progress: Dict[str, Any]) -> List[Tuple[int, UserForm, Optional[dict]]]:
+    """
+    Without the unique username index (see all_crud.ensure_indexes) nothing
+    stops duplicates, so taken usernames are looked up with one $in query.
+    """
+    usernames = [user.username for _, user, _ in batch]
+    taken = set(await all_crud.user_collection.distinct(
+        "username", {"username": {"$in": usernames}}))
+    kept = []
+    for row_no, user, profile in batch:
+        if user.username in taken:
+            _error(progress, row_no, "Username already taken")
+            continue
+        taken.add(user.username)  # later rows in this batch
+        kept.append((row_no, user, profile))
+    return kept
+
+
+async def _write_batch(batch: List[Tuple[int, UserForm, Optional[dict]]],
+                       progress: Dict[str, Any]) -> None:
+    if not all_crud.username_index_enforced:
+        batch = await _drop_taken_usernames(batch, progress)
+        if not batch:
+            return
+    hashed = await _hash_all([user.hashed_password for _, user, _ in batch])
+    user_docs = []
+    for (_, user, _), password in zip(batch, hashed):
+        doc = user.model_dump(by_alias=True)
+        doc["hashed_password"] = password
+        doc["_id"] = ObjectId()
+        user_docs.append(doc)
+
+    failed = set()
+    try:
+        await all_crud.user_collection.insert_many(user_docs, ordered=False)
+    except BulkWriteError as e:
+        for err in e.details.get("writeErrors", []):
+            failed.add(err["index"])
+            message = ("Username already taken" if err.get("code") == 11000
+                       else err.get("errmsg", "Insert failed"))
+            _error(progress, batch[err["index"]][0], message)
+    progress["created"] += len(batch) - len(failed)
+
+    now = datetime.utcnow()
+    profile_docs = []
+    for i, (_, _, profile) in enumerate(batch):
+        if i in failed or profile is None:
+            continue
+        profile["user_id"] = user_docs[i]["_id"]
+        profile["profile_created_at"] = now
+        profile["interest_codes"] = await vocabulary.intern(profile["interests"])
+        profile_docs.append(profile)
+    if profile_docs:
+        try:
+            await all_crud.profile_collection.insert_many(profile_docs, ordered=False)
+        except BulkWriteError as e:
+            progress["profile_errors"] += len(e.details.get("writeErrors", []))
+
+
+def _parse_row(row: dict) -> Tuple[UserForm, Optional[dict]]:
+    if not row.get("password"):
+        raise ValueError("password is required")
+    user = UserForm(
+        username=row.get("username"),
+        email=row.get("email"),
+        name=row.get("name"),
+        hashed_password=row["password"],
+    )
+    profile = None
+    if any(field in row for field in PROFILE_FIELDS):
+        # user_id is filled in once the user has been inserted
+        profile = UserProfileCreate(
+            user_id=ObjectId(),
+            **{f: row[f] for f in PROFILE_FIELDS if f in row},
+        ).model_dump()
+    return user, profile
+
+
+async def import_users(chunks: AsyncIterator[bytes], fmt: str,
+                       import_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Import users from a stream of CSV or NDJSON bytes.
+
+    :param chunks: The request body as it arrives.
+    :param fmt: "csv" or "ndjson".
+    :param import_id: Key under which progress is published while running.
+    :return: The final progress report.
+    """
+    import_id = import_id or str(ObjectId())
+    progress: Dict[str, Any] = {
+        "import_id": import_id, "status": "running", "rows": 0, "created": 0,
+        "failed": 0, "profile_errors": 0, "errors": [], "errors_truncated": False,
+        "started_at": datetime.utcnow(), "finished_at": None,
+    }
+    await _publish(progress)
+
+    batch: List[Tuple[int, UserForm, Optional[dict]]] = []
+    try:
+        async for row_no, row, error in iter_rows(chunks, fmt):
+            progress["rows"] = row_no
+            if error:
+                _error(progress, row_no, error)
+                continue
+            try:
+                user, profile = _parse_row(row)
+            except ValidationError as e:
+                err = e.errors()[0]
+                _error(progress, row_no,
+                       f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}")
+                continue
+            except ValueError as e:
+                _error(progress, row_no, str(e))
+                continue
+            batch.append((row_no, user, profile))
+            if len(batch) >= BATCH_SIZE:
+                await _write_batch(batch, progress)
+                await _publish(progress)
+                batch = []
+        if batch:
+            await _write_batch(batch, progress)
+        progress["status"] = "finished"
+    except Exception as e:
+        progress["status"] = "failed"
+        progress["detail"] = str(e)
+    progress["finished_at"] = datetime.utcnow()
+    await _publish(progress)
+    return progress
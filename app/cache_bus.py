@@ -0,0 +1,166 @@
+"""
+Cross-worker cache invalidation bus.
+
+Every uvicorn worker keeps its own in-process caches (e.g. the matching
+matrices), so a write handled by one worker has to reach all the others.
+`invalidate()` drops the key locally right away and appends it to the capped
+`cache_invalidations` collection; every worker tails that collection with a
+tailable/await cursor and runs the handlers subscribed to the key's prefix.
+
+Keys look like "<kind>:<id>", e.g. "event:67e7...", "profile:67e7...",
+"attendance:<event_id>".
+
+A key can carry data (anything BSON-encodable), which is handed to the
+handlers registered with `subscribe_data()` on every worker, including the
+publishing one. The live check-in feed uses this to reach dashboards connected
+to other workers.
+
+Manual check against a local single-node replica set (tailable cursors also
+work on a standalone mongod):
+
+    mongod --replSet rs0 --dbpath /tmp/rs0 && mongosh --eval "rs.initiate()"
+    python cache_bus.py listen          # in one shell (prints lag per key)
+    python cache_bus.py publish event:x # in another
+"""
+import asyncio
+import logging
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+from mongodb import database
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "cache_invalidations"
+CAPPED_SIZE_BYTES = 16 * 1024 * 1024
+RESUME_MARGIN = timedelta(seconds=5)
+
+# identifies this process; a worker skips its own messages on the bus since it
+# already applied them locally when publishing
+WORKER_ID = str(ObjectId())
+
+invalidation_collection = database[COLLECTION_NAME]
+
+_handlers: List[Tuple[str, Callable[[str], None]]] = []
+_data_handlers: List[Tuple[str, Callable[[str, Any], None]]] = []
+
+stats: Dict[str, float] = {
+    "published": 0,
+    "received": 0,
+    "last_lag_ms": 0.0,
+    "max_lag_ms": 0.0,
+    "avg_lag_ms": 0.0,
+}
+
+
+def subscribe(prefix: str, handler: Callable[[str], None]) -> None:
+    """Call `handler(key)` for every invalidated key starting with `prefix`."""
+    _handlers.append((prefix, handler))
+
+
+def subscribe_data(prefix: str, handler: Callable[[str, Any], None]) -> None:
+    """Call `handler(key, data)` for every key starting with `prefix` published with data."""
+    _data_handlers.append((prefix, handler))
+
+
+def _dispatch(key: str, data: Any = None) -> None:
+    for prefix, handler in _handlers:
+        if key.startswith(prefix):
+            handler(key)
+    if data is None:
+        return
+    for prefix, handler in _data_handlers:
+        if key.startswith(prefix):
+            handler(key, data)
+
+
+async def invalidate(*keys: str, data: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Invalidate keys in this worker and broadcast them to all the others.
+
+    :param data: Optional payload per key for the `subscribe_data` handlers.
+    """
+    if not keys:
+        return
+    data = data or {}
+    for key in keys:
+        _dispatch(key, data.get(key))
+    now = datetime.utcnow()
+    docs = []
+    for key in keys:
+        doc = {"key": key, "origin": WORKER_ID, "published_at": now}
+        if key in data:
+            doc["data"] = data[key]
+        docs.append(doc)
+    await invalidation_collection.insert_many(docs, ordered=False)
+    stats["published"] += len(keys)
+
+
+def _record_lag(published_at: datetime) -> None:
+    # relies on reasonably synced clocks between nodes
+    lag_ms = max((datetime.utcnow() - published_at).total_seconds() * 1000, 0.0)
+    stats["received"] += 1
+    stats["last_lag_ms"] = lag_ms
+    stats["max_lag_ms"] = max(stats["max_lag_ms"], lag_ms)
+    # exponentially weighted so the figure tracks recent behaviour
+    stats["avg_lag_ms"] += (lag_ms - stats["avg_lag_ms"]) * 0.1
+
+
+async def ensure_collection() -> None:
+    try:
+        await database.create_collection(
+            COLLECTION_NAME, capped=True, size=CAPPED_SIZE_BYTES)
+        # a tailable cursor on an empty capped collection dies immediately
+        await invalidation_collection.insert_one(
+            {"key": "bus:created", "origin": WORKER_ID,
+             "published_at": datetime.utcnow()})
+    except CollectionInvalid:
+        pass
+
+
+async def listen_forever(retry_seconds: float = 1.0) -> None:
+    """
+    Tail the bus and apply other workers' invalidations to this one.
+
+    ObjectIds from different processes are not ordered, so the cursor is
+    positioned by `published_at`, reaching back RESUME_MARGIN to tolerate
+    clock skew. Invalidating twice is harmless, so replays are not filtered.
+    """
+    since = datetime.utcnow() - RESUME_MARGIN
+    while True:
+        try:
+            cursor = invalidation_collection.find(
+                {"published_at": {"$gte": since}},
+                cursor_type=CursorType.TAILABLE_AWAIT,
+            )
+            while cursor.alive:
+                async for doc in cursor:
+                    since = max(since, doc["published_at"] - RESUME_MARGIN)
+                    if doc.get("origin") == WORKER_ID:
+                        continue
+                    _record_lag(doc["published_at"])
+                    _dispatch(doc["key"], doc.get("data"))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Cache invalidation listener error; retrying")
+        await asyncio.sleep(retry_seconds)
+
+
+if __name__ == "__main__":
+    async def main(command: str, keys: List[str]):
+        await ensure_collection()
+        if command == "publish":
+            await invalidate(*keys)
+            print(f"Published {keys}")
+        else:
+            subscribe("", lambda key: print(
+                f"{key} (lag {stats['last_lag_ms']:.1f} ms)"))
+            await listen_forever()
+
+    asyncio.run(main(sys.argv[1], sys.argv[2:]))
@@ -6,6 +6,38 @@ class Settings(BaseSettings):
     MONGO_URI: str
     DATABASE_NAME: str
     GITHUB_TOKEN: str
+    VOCABULARY_REFRESH_SECONDS: int = 60
+    RATE_LIMIT_BACKEND: str = "memory"  # or "mongo" to share buckets across workers
+    # requests per worker inside the LLM route / the bcrypt login route
+    LLM_CONCURRENCY_LIMIT: int = 8
+    BCRYPT_CONCURRENCY_LIMIT: int = 8
+    # write-behind batching for POST /attendance (see attendance_buffer.py)
+    ATTENDANCE_WRITE_BEHIND: bool = False
+    ATTENDANCE_DURABILITY: str = "flush"  # or "enqueue"
+    ATTENDANCE_FLUSH_INTERVAL_MS: int = 50
+    ATTENDANCE_FLUSH_MAX_RECORDS: int = 500
+    ATTENDANCE_BUFFER_MAX_RECORDS: int = 10000
+    ATTENDANCE_BUFFER_WAIT_MS: int = 1000
+    # AI prompts/responses above this many bytes are stored compressed
+    AI_TEXT_COMPRESSION_THRESHOLD: int = 4096
+    AI_TEXT_CODEC: str = "zlib"  # or "zstd" (needs the zstandard package)
+    IMPORT_HASH_WORKERS: int = 2  # processes hashing passwords for bulk imports
+    # pending messages per live check-in feed client before it is dropped
+    LIVE_FEED_QUEUE_SIZE: int = 256
+    # request profiling (see profiling.py); 0 disables sampling
+    PROFILE_SAMPLE_EVERY: int = 0
+    PROFILE_BUFFER_SIZE: int = 20
+    # background cascade after an event is deleted (see event_cleanup.py)
+    DELETION_BATCH_SIZE: int = 1000
+    DELETION_BATCH_PAUSE_MS: int = 100
+    AI_BATCH_CONCURRENCY: int = 4  # LLM requests in flight per AI batch
+    # LLM client and its hedging/circuit breaker (see llm_guard.py)
+    LLM_ENDPOINT: str = "https://models.inference.ai.azure.com"
+    LLM_TIMEOUT_SECONDS: float = 60
+    LLM_HEDGE_DELAY_SECONDS: float = 20  # until there are enough samples for a p95
+    LLM_HEDGE_BUDGET: float = 0.1  # at most this share of calls is hedged
+    LLM_BREAKER_FAILURES: int = 5
+    LLM_BREAKER_RESET_SECONDS: float = 30
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,53 @@
+"""
+Find and fix usernames held by more than one account.
+
+Signup used to check for a taken username and then insert, so concurrent
+signups could create several accounts with the same username. Such data keeps
+the unique `username` index from being built at startup (signup then falls
+back to a lookup until it is fixed).
+
+    python dedupe_users.py            list the duplicated usernames
+    python dedupe_users.py --rename   keep the oldest account's username and
+                                      rename the others to "<username>-<_id>"
+
+Renamed accounts keep their password, profile and attendance; their owners
+log in with the new username. Restart the app afterwards to build the index.
+"""
+import asyncio
+import sys
+from typing import List
+
+import all_crud
+
+
+async def main(args: List[str]) -> None:
+    rename = "--rename" in args
+    if any(a != "--rename" for a in args):
+        sys.exit(__doc__)
+
+    duplicates = await all_crud.duplicate_values(all_crud.user_collection, "username")
+    renamed = 0
+    for dup in duplicates:
+        # ObjectIds grow over time, so the smallest one signed up first
+        keep, *others = sorted(dup["ids"])
+        print(f"{dup['_id']!r}: {len(dup['ids'])} accounts, keeping {keep}")
+        if not rename:
+            continue
+        for user_id in others:
+            new_name = f"{dup['_id']}-{user_id}"
+            await all_crud.user_collection.update_one(
+                {"_id": user_id}, {"$set": {"username": new_name}})
+            print(f"  {user_id} -> {new_name!r}")
+            renamed += 1
+
+    if rename:
+        print(f"Renamed {renamed} accounts")
+        await all_crud.ensure_indexes()
+        if all_crud.username_index_enforced:
+            print("Unique username index created")
+    else:
+        print(f"{len(duplicates)} duplicated usernames")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
@@ -0,0 +1,213 @@
+"""
+Cascading deletion of an event's dependent records, run as background work.
+
+Deleting an event removes the `events` document right away and schedules a
+job in `deletion_jobs` (keyed by the event id). The job removes the event's
+attendances, AI summaries, check-in timeline counters, persona snapshot and QR
+codes in batches of DELETION_BATCH_SIZE documents, pausing
+DELETION_BATCH_PAUSE_MS between batches, so removing a large event does not
+load the database for everyone else. Each worker runs one job at a time, and
+jobs are claimed atomically, so several workers never work on the same event.
+Progress is stored on the job, and unfinished jobs are picked up again at
+startup.
+
+Orphans left behind by deletions made before this existed:
+
+    python event_cleanup.py sweep [--dry-run]
+"""
+import asyncio
+import inspect
+import logging
+import re
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from bson import ObjectId
+
+import all_crud
+import timeline
+from config import settings
+from mongodb import database
+
+logger = logging.getLogger(__name__)
+
+job_collection = database.deletion_jobs
+qr_collection = database.qr_codes
+
+# a running job whose heartbeat is older than this is considered abandoned
+LEASE = timedelta(seconds=60)
+
+# qr_codes store the event id as a string, sometimes at the end of a URL
+_TRAILING_ID = re.compile(r"([0-9a-fA-F]{24})$")
+
+_slots = asyncio.Semaphore(1)
+_tasks = set()
+
+
+async def _qr_query(event_id: ObjectId) -> dict:
+    # the unanchored $regex scans the whole collection, so it is run once and
+    # the batches then delete by _id
+    cursor = qr_collection.find({"$or": [
+        {"event_id": {"$in": [event_id, str(event_id)]}},
+        {"event_id": {"$regex": f"{event_id}$"}},
+    ]}, {"_id": 1})
+    return {"_id": {"$in": [doc["_id"] async for doc in cursor]}}
+
+
+def dependents() -> List[Tuple[str, Any, str, Callable[[ObjectId], Union[dict, Awaitable[dict]]]]]:
+    """
+    (name, collection, event id field, query for an event id) for every
+    dependent collection. A query function may be async.
+    """
+    return [
+        ("attendances", all_crud.attendance_collection, "event_id",
+         lambda oid: {"event_id": oid}),
+        ("ai_summaries", all_crud.ai_summary_collection, "event_id",
+         lambda oid: {"event_id": oid}),
+        ("checkin_timeline", timeline.timeline_collection, "event_id",
+         lambda oid: {"event_id": oid}),
+        ("event_personas", all_crud.event_persona_collection, "_id",
+         lambda oid: {"_id": oid}),
+        ("qr_codes", qr_collection, "event_id", _qr_query),
+    ]
+
+
+async def _delete_in_batches(job_id: ObjectId, name: str, collection, query: dict) -> None:
+    pause = settings.DELETION_BATCH_PAUSE_MS / 1000
+    while True:
+        cursor = collection.find(query, {"_id": 1}).limit(settings.DELETION_BATCH_SIZE)
+        ids = [doc["_id"] async for doc in cursor]
+        if not ids:
+            return
+        result = await collection.delete_many({"_id": {"$in": ids}})
+        await job_collection.update_one({"_id": job_id}, {
+            "$inc": {f"deleted.{name}": result.deleted_count},
+            "$set": {"heartbeat_at": datetime.utcnow()},
+        })
+        await asyncio.sleep(pause)
+
+
+async def _claim(job_id: ObjectId) -> bool:
+    now = datetime.utcnow()
+    job = await job_collection.find_one_and_update(
+        {"_id": job_id, "$or": [
+            {"status": {"$in": ["pending", "failed"]}},
+            {"status": "running", "heartbeat_at": {"$lt": now - LEASE}},
+        ]},
+        {"$set": {"status": "running", "started_at": now, "heartbeat_at": now}},
+    )
+    return job is not None
+
+
+async def _cascade(job_id: ObjectId) -> None:
+    try:
+        for name, collection, _, query in dependents():
+            query = query(job_id)
+            if inspect.isawaitable(query):
+                query = await query
+            await _delete_in_batches(job_id, name, collection, query)
+    except Exception as e:
+        logger.exception("Deletion of event %s failed", job_id)
+        await job_collection.update_one(
+            {"_id": job_id}, {"$set": {"status": "failed", "error": str(e)}})
+        return
+    await job_collection.update_one({"_id": job_id}, {"$set": {
+        "status": "finished", "finished_at": datetime.utcnow(), "error": None}})
+
+
+async def run(job_id: ObjectId, wait_for_lease: bool = False) -> None:
+    """
+    Run the cascade for one event if no other worker holds its job.
+
+    :param wait_for_lease: Keep retrying while another worker holds the job, so
+        a job whose worker died is taken over once its lease expires.
+    """
+    while True:
+        async with _slots:
+            if await _claim(job_id):
+                await _cascade(job_id)
+                return
+            job = await job_collection.find_one({"_id": job_id}, {"status": 1})
+        if not wait_for_lease or not job or job["status"] != "running":
+            return
+        await asyncio.sleep(LEASE.total_seconds())
+
+
+def _start(job_id: ObjectId, wait_for_lease: bool = False) -> None:
+    task = asyncio.create_task(run(job_id, wait_for_lease))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def _create_job(job_id: ObjectId) -> dict:
+    job = {
+        "_id": job_id, "status": "pending", "created_at": datetime.utcnow(),
+        "started_at": None, "heartbeat_at": None, "finished_at": None,
+        "deleted": {}, "error": None,
+    }
+    await job_collection.replace_one({"_id": job_id}, job, upsert=True)
+    return job
+
+
+async def schedule(event_id: str) -> dict:
+    """
+    Record a deletion job for an already deleted event and start it in the
+    background.
+
+    :return: The new job document.
+    """
+    job = await _create_job(ObjectId(event_id))
+    _start(job["_id"])
+    return job
+
+
+async def resume() -> None:
+    """Restart jobs left unfinished by a previous process (called at startup)."""
+    cursor = job_collection.find(
+        {"status": {"$in": ["pending", "running", "failed"]}}, {"_id": 1})
+    async for job in cursor:
+        _start(job["_id"], wait_for_lease=True)
+
+
+async def get_job(event_id: str) -> Optional[dict]:
+    return await job_collection.find_one({"_id": ObjectId(event_id)})
+
+
+async def find_orphans() -> Dict[ObjectId, Set[str]]:
+    """Event ids referenced by dependent records but missing from `events`."""
+    referenced: Dict[ObjectId, Set[str]] = {}
+    for name, collection, field, _ in dependents():
+        for value in await collection.distinct(field):
+            if isinstance(value, str):
+                match = _TRAILING_ID.search(value)
+                if not match:
+                    continue
+                value = ObjectId(match.group(1))
+            if isinstance(value, ObjectId):
+                referenced.setdefault(value, set()).add(name)
+
+    ids = list(referenced)
+    existing = set()
+    for i in range(0, len(ids), settings.DELETION_BATCH_SIZE):
+        cursor = all_crud.event_collection.find(
+            {"_id": {"$in": ids[i:i + settings.DELETION_BATCH_SIZE]}}, {"_id": 1})
+        existing.update([doc["_id"] async for doc in cursor])
+    return {oid: names for oid, names in referenced.items() if oid not in existing}
+
+
+if __name__ == "__main__":
+    async def sweep(dry_run: bool):
+        orphans = await find_orphans()
+        for event_id, names in orphans.items():
+            print(f"{event_id}: orphaned {', '.join(sorted(names))}")
+            if not dry_run:
+                await _create_job(event_id)
+                await run(event_id)
+                job = await job_collection.find_one({"_id": event_id})
+                print(f"{event_id}: {job['status']} {job['deleted']}")
+        print(f"{len(orphans)} orphaned event ids")
+
+    if sys.argv[1:2] != ["sweep"]:
+        sys.exit("usage: python event_cleanup.py sweep [--dry-run]")
+    asyncio.run(sweep("--dry-run" in sys.argv[2:]))
@@ -0,0 +1,94 @@
+"""
+Streaming NDJSON/CSV exports straight from a Mongo cursor.
+
+Documents are serialized as they come off the cursor (no pydantic models, no
+list of results) and written out in ~64 KB chunks, optionally gzip-compressed
+on the fly, so memory use does not depend on the number of rows exported.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, List
+
+from bson import ObjectId
+from fastapi.responses import StreamingResponse
+
+ATTENDANCE_FIELDS = ["_id", "user_id", "event_id", "scanned_at", "feedback"]
+EVENT_FIELDS = ["_id", "name", "description", "date", "location", "tags", "created_at"]
+
+CHUNK_BYTES = 64 * 1024
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot export {type(value).__name__}")
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return ";".join(str(v) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, default=_default)
+    if isinstance(value, (ObjectId, datetime)):
+        return _default(value)
+    return value
+
+
+async def ndjson_chunks(cursor, fields: List[str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    async for doc in cursor:
+        buffer.write(json.dumps({f: doc.get(f) for f in fields}, default=_default))
+        buffer.write("\n")
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer = io.StringIO()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def csv_chunks(cursor, fields: List[str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    async for doc in cursor:
+        writer.writerow([_csv_value(doc.get(f)) for f in fields])
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 = gzip container
+    async for chunk in chunks:
+        packed = compressor.compress(chunk)
+        if packed:
+            yield packed
+    yield compressor.flush()
+
+
+def stream_response(cursor, fields: List[str], fmt: str, gzip: bool,
+                    name: str) -> StreamingResponse:
+    chunks = csv_chunks(cursor, fields) if fmt == "csv" else ndjson_chunks(cursor, fields)
+    filename = f"{name}.{fmt}"
+    media_type = MEDIA_TYPES[fmt]
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -127,7 +127,7 @@ async def populate_attendances(events: list, users: list):
             att_data = {
                 "user_id": user["_id"],
                 "event_id": event.model_dump(by_alias=True)["_id"],
-                "scanned_at": datetime.utcnow().isoformat(),
+                "scanned_at": datetime.utcnow(),
                 "feedback": feedback,
             }
             new_att = await create_attendance(att_data)
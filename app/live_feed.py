@@ -0,0 +1,152 @@
+"""
+In-process pub/sub behind the live check-in WebSocket feed.
+
+Each connected dashboard subscribes to one event and gets its own bounded
+queue. New attendance records travel with the "attendance:<event_id>" key on
+the cache bus, so every worker sees every check-in whichever worker wrote it.
+Each worker encodes a check-in to JSON once and hands the same string to all
+of its subscribers for the event with a non-blocking put, so a write never
+waits on a client. A subscriber whose queue is full has fallen behind; it is dropped (its
+queue is replaced by a single close marker) and the dashboard reconnects to get
+a fresh snapshot. While the snapshot is still being sent the queue is
+unbounded, since a large event's snapshot can take longer than the queue
+lasts during a surge; the limit applies from `start_limit()` on, on top of
+whatever is waiting by then.
+"""
+import asyncio
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from bson import ObjectId
+
+import all_crud
+import cache_bus
+from all_model import AttendanceDB
+from config import settings
+from raw_bson import decoder_for
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+class Subscriber:
+    def __init__(self, topic: str, maxsize: int):
+        self.topic = topic
+        self.maxsize = maxsize
+        self.queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        # no limit until the snapshot has been sent
+        self.limit: Optional[int] = None
+        self.dropped = False
+
+    def start_limit(self) -> None:
+        self.limit = self.queue.qsize() + self.maxsize
+
+    def offer(self, message: str) -> bool:
+        if self.limit is not None and self.queue.qsize() >= self.limit:
+            return False
+        self.queue.put_nowait(message)
+        # shrink back towards maxsize as the client catches up
+        if self.limit is not None:
+            self.limit = max(self.maxsize, min(self.limit, self.queue.qsize() + self.maxsize))
+        return True
+
+    def close(self) -> None:
+        """Discard anything pending and leave only the close marker (None)."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class Hub:
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.topics: Dict[str, Set[Subscriber]] = defaultdict(set)
+        self.stats = {"published": 0, "delivered": 0, "dropped_subscribers": 0}
+
+    def subscribe(self, topic: str) -> Subscriber:
+        subscriber = Subscriber(topic, self.queue_size)
+        self.topics[topic].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        subscribers = self.topics.get(subscriber.topic)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self.topics[subscriber.topic]
+
+    def publish(self, topic: str, message: str) -> None:
+        subscribers = self.topics.get(topic)
+        if not subscribers:
+            return
+        self.stats["published"] += 1
+        slow = []
+        for subscriber in subscribers:
+            if subscriber.offer(message):
+                self.stats["delivered"] += 1
+            else:
+                slow.append(subscriber)
+        for subscriber in slow:
+            subscriber.dropped = True
+            subscriber.close()
+            self.unsubscribe(subscriber)
+            self.stats["dropped_subscribers"] += 1
+
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self.topics.values())
+
+
+hub = Hub(settings.LIVE_FEED_QUEUE_SIZE)
+
+SNAPSHOT_PAGE_SIZE = 1000
+
+
+def checkin_topic(event_id: Any) -> str:
+    return f"checkins:{event_id}"
+
+
+def encode_checkin(doc: dict) -> str:
+    attendance = decoder_for(AttendanceDB).shape(doc)
+    return json.dumps({"type": "checkin", "attendance": attendance},
+                      default=_default, separators=(",", ":"))
+
+
+def encode_snapshot(docs: List[dict], last: bool = True) -> str:
+    shape = decoder_for(AttendanceDB).shape
+    return json.dumps({"type": "snapshot", "attendances": [shape(d) for d in docs],
+                       "last": last},
+                      default=_default, separators=(",", ":"))
+
+
+async def snapshot_messages(event_id: str) -> AsyncIterator[str]:
+    """
+    The event's complete attendee list, streamed from a cursor as snapshot
+    messages of up to SNAPSHOT_PAGE_SIZE records. Only the final one has
+    "last": true (it may be empty).
+    """
+    page: List[dict] = []
+    async for doc in all_crud.attendance_export_cursor(event_id=event_id):
+        page.append(doc)
+        if len(page) == SNAPSHOT_PAGE_SIZE:
+            yield encode_snapshot(page, last=False)
+            page = []
+    yield encode_snapshot(page)
+
+
+def publish_checkins(key: str, docs: List[dict]) -> None:
+    """Cache bus handler: push an event's new check-ins to its subscribers here."""
+    topic = checkin_topic(key.split(":", 1)[1])
+    if topic in hub.topics:
+        for doc in docs:
+            hub.publish(topic, encode_checkin(doc))
+
+
+cache_bus.subscribe_data("attendance:", publish_checkins)
@@ -0,0 +1,203 @@
+"""
+Tail-latency and outage protection for the blocking LLM client.
+
+`call(fn, *args)` runs `fn` (e.g. ai_integration.call_azure_llm) in a thread
+and:
+
+- hedges: if no answer has arrived after a delay derived from the p95 of recent
+  successful calls (LLM_HEDGE_DELAY_SECONDS until there are enough samples), or
+  if the first attempt fails, a second identical request is sent and whichever
+  succeeds first wins. Hedges are limited to LLM_HEDGE_BUDGET of all calls so
+  a slow upstream does not see double the load.
+- gives up after LLM_TIMEOUT_SECONDS.
+- trips a circuit breaker after LLM_BREAKER_FAILURES consecutive failed calls.
+  While the circuit is open calls fail immediately with CircuitOpenError; after
+  LLM_BREAKER_RESET_SECONDS one trial call is let through and closes the
+  circuit again if it succeeds.
+
+Only transient failures (timeouts, connection errors, 429 and 5xx answers)
+are hedged and count towards the breaker. Any other 4xx answer (bad request,
+auth, prompt too long) would fail the same way again, so it is re-raised as
+is right away.
+
+The losing request's thread cannot be interrupted; it finishes in the
+background and is bounded by the client's read timeout.
+
+To try it locally, run the fault-injecting stub (llm_stub.py) and point
+LLM_ENDPOINT at it.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from config import settings
+
+MIN_SAMPLES = 20
+# 4xx answers that are still worth another try
+TRANSIENT_CLIENT_STATUS = (408, 429)
+
+
+class LLMUnavailableError(Exception):
+    """The LLM did not produce an answer (failed, timed out or circuit open)."""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    def __init__(self, retry_after: float):
+        super().__init__(f"LLM circuit open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class LatencyTracker:
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def hedge_delay(self) -> float:
+        p95 = self.p95()
+        return settings.LLM_HEDGE_DELAY_SECONDS if p95 is None else p95
+
+
+class CircuitBreaker:
+    def __init__(self, failures: int, reset_seconds: float):
+        self.max_failures = failures
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+
+    def allow(self) -> None:
+        """Raise CircuitOpenError unless a call may go through now."""
+        if self.state == "closed":
+            return
+        waited = time.monotonic() - self.opened_at
+        if self.state == "open" and waited >= self.reset_seconds:
+            self.state = "half_open"
+        if self.state == "half_open" and not self.trial_running:
+            self.trial_running = True
+            return
+        raise CircuitOpenError(max(self.reset_seconds - waited, 1))
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self.trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.trial_running = False
+        if self.state == "half_open" or self.failures >= self.max_failures:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+latencies = LatencyTracker()
+breaker = CircuitBreaker(settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_RESET_SECONDS)
+stats = {"calls": 0, "succeeded": 0, "failed": 0, "timed_out": 0,
+         "rejected": 0, "client_errors": 0, "hedges": 0, "hedge_wins": 0}
+
+
+def snapshot() -> Dict[str, Any]:
+    return {**stats, "circuit": breaker.state, "p95_seconds": latencies.p95(),
+            "hedge_delay_seconds": latencies.hedge_delay()}
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Whether a failed attempt may succeed when repeated. Errors carrying an
+    HTTP status (azure.core.exceptions.HttpResponseError) are transient for
+    408, 429 and 5xx only; everything else (connection errors, timeouts)
+    is transient.
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        return True
+    return status >= 500 or status in TRANSIENT_CLIENT_STATUS
+
+
+def _hedge_allowed() -> bool:
+    return stats["hedges"] < settings.LLM_HEDGE_BUDGET * stats["calls"] + 1
+
+
+def _discard(task: asyncio.Task) -> None:
+    # the losing attempt's result or error is not needed
+    if not task.cancelled():
+        task.exception()
+
+
+async def call(fn: Callable[..., str], *args: Any) -> str:
+    """
+    Run the blocking `fn(*args)` with hedging, a deadline and the breaker.
+
+    :raises CircuitOpenError: The circuit is open; nothing was sent.
+    :raises LLMUnavailableError: Every attempt failed or the deadline passed.
+    :raises Exception: The LLM rejected the request (non-transient 4xx); not
+                       retried and not counted as a failure by the breaker.
+    """
+    try:
+        breaker.allow()
+    except CircuitOpenError:
+        stats["rejected"] += 1
+        raise
+    stats["calls"] += 1
+    started = time.monotonic()
+    deadline = started + settings.LLM_TIMEOUT_SECONDS
+    attempts = {asyncio.create_task(asyncio.to_thread(fn, *args)): "first"}
+    hedged = False
+    last_error: Optional[BaseException] = None
+    try:
+        while attempts:
+            now = time.monotonic()
+            timeout = deadline - now
+            if not hedged:
+                timeout = min(timeout, max(started + latencies.hedge_delay() - now, 0))
+            done, _ = await asyncio.wait(
+                attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                label = attempts.pop(task)
+                if task.exception() is None:
+                    latencies.add(time.monotonic() - started)
+                    breaker.record_success()
+                    stats["succeeded"] += 1
+                    if label == "hedge":
+                        stats["hedge_wins"] += 1
+                    return task.result()
+                last_error = task.exception()
+                if not is_transient(last_error):
+                    # the upstream answered, so this says nothing about its health
+                    breaker.trial_running = False
+                    stats["client_errors"] += 1
+                    raise last_error
+            if time.monotonic() >= deadline:
+                stats["timed_out"] += 1
+                last_error = TimeoutError(
+                    f"No LLM answer within {settings.LLM_TIMEOUT_SECONDS}s")
+                break
+            # slow (hedge delay passed) or failed first attempt: send another
+            if not hedged and (not done or not attempts) and _hedge_allowed():
+                hedged = True
+                stats["hedges"] += 1
+                attempts[asyncio.create_task(asyncio.to_thread(fn, *args))] = "hedge"
+            elif not hedged and not attempts:
+                break
+            elif not hedged:
+                hedged = True  # over budget: just wait for the first attempt
+    except asyncio.CancelledError:
+        # the caller went away; let the next call probe a half-open circuit
+        breaker.trial_running = False
+        raise
+    finally:
+        for task in attempts:
+            task.add_done_callback(_discard)
+    breaker.record_failure()
+    stats["failed"] += 1
+    raise LLMUnavailableError(f"LLM request failed: {last_error}") from last_error
@@ -0,0 +1,109 @@
+"""
+Fault-injecting stand-in for the chat completions endpoint, for exercising
+llm_guard locally.
+
+    python llm_stub.py --port 8099 --latency 0.5 --slow-rate 0.1 --slow-seconds 30 --error-rate 0.05
+    LLM_ENDPOINT=http://localhost:8099 uvicorn main:app
+
+Every POST .../chat/completions answers after `latency` seconds; a `slow-rate`
+share of them takes `slow-seconds` instead and an `error-rate` share fails with
+`error-status`. The faults can be changed while it runs, e.g. to simulate an
+outage and recovery:
+
+    curl -X POST localhost:8099/faults -d '{"error_rate": 1.0}'
+    curl -X POST localhost:8099/faults -d '{"error_rate": 0.0}'
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+faults = {"latency": 0.5, "slow_rate": 0.0, "slow_seconds": 30.0,
+          "error_rate": 0.0, "error_status": 503}
+counts = {"requests": 0, "slow": 0, "errors": 0}
+lock = threading.Lock()
+
+
+def completion(prompt: str) -> dict:
+    labels = [line.split()[2].rstrip(":") for line in prompt.splitlines()
+              if line.startswith("### Event E")]
+    if labels:
+        # packed batch prompt (ai_batch): one JSON entry per event label
+        content = json.dumps({label: f"Stub analysis for {label}." for label in labels})
+    else:
+        content = "Stub analysis: overall positive sentiment.\n\n1. Stub recommendation."
+    return {
+        "id": f"stub-{time.time_ns()}",
+        "created": int(time.time()),
+        "model": "stub",
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 20,
+                  "total_tokens": len(prompt) // 4 + 20},
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    def _send(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        with lock:
+            self._send(200, {"faults": faults, "counts": counts})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.startswith("/faults"):
+            with lock:
+                faults.update(json.loads(body or b"{}"))
+                self._send(200, faults)
+            return
+        if "/chat/completions" not in self.path:
+            self._send(404, {"error": {"message": "Not found"}})
+            return
+
+        with lock:
+            counts["requests"] += 1
+            slow = random.random() < faults["slow_rate"]
+            error = random.random() < faults["error_rate"]
+            counts["slow"] += slow
+            counts["errors"] += error
+            delay = faults["slow_seconds"] if slow else faults["latency"]
+            status = faults["error_status"]
+        time.sleep(delay)
+        if error:
+            self._send(status, {"error": {"code": "Injected", "message": "Injected fault"}})
+            return
+        messages = json.loads(body).get("messages", [])
+        prompt = messages[-1].get("content", "") if messages else ""
+        try:
+            self._send(200, completion(prompt))
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (timeout or lost hedge)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=faults["latency"])
+    parser.add_argument("--slow-rate", type=float, default=faults["slow_rate"])
+    parser.add_argument("--slow-seconds", type=float, default=faults["slow_seconds"])
+    parser.add_argument("--error-rate", type=float, default=faults["error_rate"])
+    parser.add_argument("--error-status", type=int, default=faults["error_status"])
+    args = parser.parse_args()
+    faults.update(latency=args.latency, slow_rate=args.slow_rate,
+                  slow_seconds=args.slow_seconds, error_rate=args.error_rate,
+                  error_status=args.error_status)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), Handler)
+    print(f"LLM stub on http://127.0.0.1:{args.port} with {faults}")
+    server.serve_forever()
@@ -1,6 +1,17 @@
+import asyncio
 from fastapi import FastAPI
 import all_api
+import all_crud
+import attendance_buffer
 import authentication
+import bulk_import
+import cache_bus
+import event_cleanup
+import profiling
+import rate_limit
+import timeline
+import vocabulary
+from config import settings
 
 
 app = FastAPI()
@@ -8,3 +19,31 @@ app = FastAPI()
 # app.include_router(user_api.router)
 app.include_router(all_api.router)
 app.include_router(authentication.router)
+# admin-requested (X-Profile header) and sampled request profiling
+app.middleware("http")(profiling.middleware)
+
+# keep references so long-running tasks are not garbage collected
+background_tasks = set()
+
+
+@app.on_event("startup")
+async def startup():
+    await all_crud.ensure_indexes()
+    await cache_bus.ensure_collection()
+    background_tasks.add(asyncio.create_task(cache_bus.listen_forever()))
+    if isinstance(rate_limit.backend, rate_limit.MongoBackend):
+        await rate_limit.backend.ensure_indexes()
+    await timeline.ensure_indexes()
+    await vocabulary.ensure_indexes()
+    await vocabulary.load()
+    background_tasks.add(asyncio.create_task(vocabulary.refresh_forever()))
+    await event_cleanup.resume()
+    if settings.ATTENDANCE_WRITE_BEHIND:
+        attendance_buffer.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    # flush buffered check-ins before the worker exits
+    await attendance_buffer.stop()
+    bulk_import.shutdown_pool()
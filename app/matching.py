@@ -0,0 +1,244 @@
+"""
+"People to meet" suggestions between attendees of an event.
+
+Every attendee's interests (as vocabulary codes), major and personality_type
+are packed into a single Python int used as a bitset over a per-event bit
+layout. Scoring the caller against all other attendees is then an AND/OR plus
+popcount per attendee instead of list and string comparisons. The packed
+matrix is cached per event and dropped (on every worker, via the cache bus)
+whenever attendance for that event or any profile changes; a matrix whose
+build overlapped such an invalidation is used once but not cached. At most
+MAX_CACHED_EVENTS matrices are kept, least recently used first out.
+"""
+import asyncio
+import heapq
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+import all_crud
+import cache_bus
+import vocabulary
+
+# Attribute groups that take part in matching and their weight in the
+# "weighted" metric. Majors count double, personality types half.
+GROUP_WEIGHTS: Dict[str, float] = {
+    "interests": 1.0,
+    "major": 2.0,
+    "personality_type": 0.5,
+}
+
+METRICS = ("jaccard", "weighted")
+
+MAX_CACHED_EVENTS = 256
+
+
+def _profile_terms(profile: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    codes = profile.get("interest_codes")
+    if not codes and profile.get("interests"):
+        # written before the vocabulary existed; fall back to the strings
+        codes = [vocabulary.code_for(t) or vocabulary.normalize(t)
+                 for t in profile["interests"] if t and t.strip()]
+    terms = [("interests", c) for c in codes or []]
+    for group in ("major", "personality_type"):
+        value = profile.get(group)
+        if value and value.strip():
+            terms.append((group, vocabulary.normalize(value)))
+    return terms
+
+
+@dataclass
+class EventMatrix:
+    """Packed attribute bitsets for every attendee of one event."""
+    user_ids: List[ObjectId] = field(default_factory=list)
+    rows: List[int] = field(default_factory=list)
+    # (group, interest code or normalized term) -> bit position, and the reverse
+    bits: Dict[Tuple[str, Any], int] = field(default_factory=dict)
+    terms: List[Tuple[str, Any]] = field(default_factory=list)
+    # group -> mask with every bit that belongs to the group
+    group_masks: Dict[str, int] = field(default_factory=dict)
+
+    def encode(self, profile: Dict[str, Any], grow: bool = False,
+               unmatched: Optional[Dict[str, int]] = None) -> int:
+        """
+        :param unmatched: Without `grow`, filled with the number of terms per
+                          group that have no bit (and so are not in the row).
+        """
+        row = 0
+        for key in dict.fromkeys(_profile_terms(profile)):
+            bit = self.bits.get(key)
+            if bit is None:
+                if not grow:
+                    # a term nobody else has can never be shared, but it
+                    # still counts towards the union when scoring
+                    if unmatched is not None:
+                        unmatched[key[0]] = unmatched.get(key[0], 0) + 1
+                    continue
+                bit = len(self.terms)
+                self.bits[key] = bit
+                self.terms.append(key)
+                self.group_masks[key[0]] = self.group_masks.get(
+                    key[0], 0) | (1 << bit)
+            row |= 1 << bit
+        return row
+
+    def decode(self, row: int, group: str) -> List[str]:
+        row &= self.group_masks.get(group, 0)
+        out = []
+        while row:
+            low = row & -row
+            term = self.terms[low.bit_length() - 1][1]
+            if isinstance(term, int):
+                # None only if the code could not be found at all
+                term = vocabulary.term_for(term)
+            if term is not None:
+                out.append(term)
+            row ^= low
+        return out
+
+
+def build_matrix(profiles: List[Dict[str, Any]]) -> EventMatrix:
+    matrix = EventMatrix()
+    for profile in profiles:
+        matrix.user_ids.append(profile["user_id"])
+        matrix.rows.append(matrix.encode(profile, grow=True))
+    return matrix
+
+
+def top_matches(
+    matrix: EventMatrix,
+    row: int,
+    k: int = 10,
+    metric: str = "jaccard",
+    exclude: Optional[ObjectId] = None,
+    unmatched: Optional[Dict[str, int]] = None,
+) -> List[Tuple[float, int]]:
+    """
+    Score `row` against every attendee and return the k best (score, index) pairs.
+    Attendees with nothing in common (score 0) are never returned.
+
+    :param unmatched: Terms per group the caller has beyond `row` (see
+                      EventMatrix.encode); they only enlarge the union.
+    """
+    unmatched = unmatched or {}
+    if metric == "weighted":
+        masks = [(w, matrix.group_masks[g])
+                 for g, w in GROUP_WEIGHTS.items() if g in matrix.group_masks]
+        extra = sum(GROUP_WEIGHTS.get(g, 0) * n for g, n in unmatched.items())
+
+        def score(other: int) -> float:
+            both, either = row & other, row | other
+            num = sum(w * (both & m).bit_count() for w, m in masks)
+            den = sum(w * (either & m).bit_count() for w, m in masks) + extra
+            return num / den if den else 0.0
+    else:
+        extra = sum(unmatched.values())
+
+        def score(other: int) -> float:
+            either = (row | other).bit_count() + extra
+            return (row & other).bit_count() / either if either else 0.0
+
+    scored = (
+        (score(other), i)
+        for i, other in enumerate(matrix.rows)
+        if other & row and matrix.user_ids[i] != exclude
+    )
+    return heapq.nlargest(k, scored)
+
+
+# ---------------------------
+# Per-event cache
+# ---------------------------
+_matrices: "OrderedDict[str, EventMatrix]" = OrderedDict()
+# only held while a matrix is being built
+_locks: Dict[str, asyncio.Lock] = {}
+# bumped by invalidations of an event whose matrix is being built
+_generations: Dict[str, int] = {}
+
+
+async def get_event_matrix(event_id: str) -> EventMatrix:
+    matrix = _matrices.get(event_id)
+    if matrix is not None:
+        _matrices.move_to_end(event_id)
+        return matrix
+    lock = _locks.setdefault(event_id, asyncio.Lock())
+    try:
+        async with lock:
+            # another request may have built it while we waited
+            matrix = _matrices.get(event_id)
+            if matrix is None:
+                generation = _generations.setdefault(event_id, 0)
+                profiles = await all_crud.get_event_attendee_profiles(event_id)
+                matrix = build_matrix(profiles)
+                # codes interned by other workers since our last vocabulary refresh
+                await vocabulary.load_codes(
+                    term for group, term in matrix.terms if isinstance(term, int))
+                # invalidated while we were reading: may already be stale
+                if _generations.get(event_id) == generation:
+                    _matrices[event_id] = matrix
+                    while len(_matrices) > MAX_CACHED_EVENTS:
+                        _matrices.popitem(last=False)
+    finally:
+        # later requests find the matrix in the cache (or build it again)
+        if _locks.get(event_id) is lock:
+            del _locks[event_id]
+        if event_id not in _locks:
+            _generations.pop(event_id, None)
+    return matrix
+
+
+def invalidate_event(event_id: str) -> None:
+    _matrices.pop(event_id, None)
+    if event_id in _generations:
+        _generations[event_id] += 1
+
+
+def invalidate_all() -> None:
+    _matrices.clear()
+    for event_id in _generations:
+        _generations[event_id] += 1
+
+
+# "attendance:<event_id>" and "event:<event_id>" drop that event's matrix; a
+# profile can appear in any number of event matrices so it drops them all
+cache_bus.subscribe("attendance:", lambda key: invalidate_event(key.split(":", 1)[1]))
+cache_bus.subscribe("event:", lambda key: invalidate_event(key.split(":", 1)[1]))
+cache_bus.subscribe("profile:", lambda key: invalidate_all())
+
+
+async def matches_for_user(
+    event_id: str,
+    user_id: ObjectId,
+    k: int = 10,
+    metric: str = "jaccard",
+) -> List[Dict[str, Any]]:
+    """
+    Suggest the k attendees of `event_id` most similar to `user_id`.
+
+    :return: A list of match dictionaries, best first.
+    """
+    matrix = await get_event_matrix(event_id)
+    unmatched: Dict[str, int] = {}
+    try:
+        row = matrix.rows[matrix.user_ids.index(user_id)]
+    except ValueError:
+        # not checked in (yet): score their profile against the attendees; a
+        # user without a stored profile has nothing to match on
+        profile = await all_crud.get_profile_matching_fields(str(user_id))
+        row = matrix.encode(profile or {}, unmatched=unmatched)
+
+    results = []
+    for score, i in top_matches(matrix, row, k=k, metric=metric,
+                                exclude=user_id, unmatched=unmatched):
+        shared = row & matrix.rows[i]
+        results.append({
+            "user_id": matrix.user_ids[i],
+            "score": round(score, 4),
+            "shared_interests": matrix.decode(shared, "interests"),
+            "same_major": bool(shared & matrix.group_masks.get("major", 0)),
+            "same_personality_type": bool(
+                shared & matrix.group_masks.get("personality_type", 0)),
+        })
+    return results
@@ -1,7 +1,46 @@
+from contextvars import ContextVar
+import threading
+from typing import Optional
+
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 from config import settings
 
-client = AsyncIOMotorClient(settings.MONGO_URI)
+
+class CommandTime:
+    """Time spent in Mongo commands issued while it is the current timer."""
+
+    def __init__(self):
+        self.micros = 0
+        self.commands = 0
+        self._lock = threading.Lock()
+
+    def add(self, micros: int) -> None:
+        # commands run on motor's executor threads
+        with self._lock:
+            self.micros += micros
+            self.commands += 1
+
+
+# set by the request profiler; motor copies the context into its executor
+current_command_time: ContextVar[Optional[CommandTime]] = ContextVar(
+    "current_command_time", default=None)
+
+
+class CommandTimer(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        timer = current_command_time.get()
+        if timer is not None:
+            timer.add(event.duration_micros)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+client = AsyncIOMotorClient(settings.MONGO_URI, event_listeners=[CommandTimer()])
 # change clinet.(name) for
 # use HACKATHONFAKED for AI integrations
 database = client.HACKATHONFAKED
@@ -0,0 +1,92 @@
+"""
+Consistency check and rebuild of the per-event persona snapshots
+(`event_personas`, maintained incrementally by all_crud).
+
+    python personas.py check [--repair] [event_id ...]
+    python personas.py rebuild [event_id ...]
+
+Without event ids, every event with attendance or a snapshot is processed.
+`check` compares each snapshot with a fresh build from attendances and
+user_profiles and reports missing, extra and stale attendees; `--repair`
+rebuilds the events that drifted. Events with more than
+all_crud.MAX_SNAPSHOT_PERSONAS attendees keep only a `too_large` marker and are
+skipped by `check`.
+"""
+import asyncio
+import sys
+from typing import Any, Dict, List
+
+from bson import ObjectId
+
+import all_crud
+
+
+def _key(persona: Dict[str, Any]) -> tuple:
+    return tuple(
+        tuple(v) if isinstance(v, list) else v
+        for v in (persona.get(f) for f in all_crud.PERSONA_FIELDS))
+
+
+async def check(event_id: str) -> Dict[str, Any]:
+    """
+    :return: {"missing": [...], "extra": [...], "stale": [...]} user ids (as
+             strings), "snapshot": whether the event has a snapshot at all and
+             "too_large": whether it is only a marker.
+    """
+    snapshot = await all_crud.event_persona_collection.find_one(
+        {"_id": ObjectId(event_id)})
+    if snapshot is not None and snapshot.get("too_large"):
+        return {"snapshot": True, "too_large": True,
+                "missing": [], "extra": [], "stale": []}
+    stored = {p["user_id"]: p for p in (snapshot or {}).get("personas", [])}
+    fresh = {p["user_id"]: p for p in await all_crud.build_event_personas(event_id)}
+    return {
+        "snapshot": snapshot is not None,
+        "too_large": False,
+        "missing": [str(u) for u in fresh.keys() - stored.keys()],
+        "extra": [str(u) for u in stored.keys() - fresh.keys()],
+        "stale": [str(u) for u in fresh.keys() & stored.keys()
+                  if _key(fresh[u]) != _key(stored[u])],
+    }
+
+
+async def all_event_ids() -> List[str]:
+    ids = set(await all_crud.attendance_collection.distinct("event_id"))
+    ids.update(await all_crud.event_persona_collection.distinct("_id"))
+    return [str(i) for i in ids]
+
+
+async def main(args: List[str]) -> None:
+    command = args[0] if args else None
+    repair = "--repair" in args
+    event_ids = [a for a in args[1:] if not a.startswith("--")]
+    if command not in ("check", "rebuild"):
+        sys.exit(__doc__)
+    event_ids = event_ids or await all_event_ids()
+
+    drifted = 0
+    for event_id in event_ids:
+        if command == "rebuild":
+            personas = await all_crud.rebuild_event_personas(event_id)
+            print(f"{event_id}: {len(personas)} personas")
+            continue
+        report = await check(event_id)
+        if not report["snapshot"]:
+            print(f"{event_id}: no snapshot (built on first read)")
+            continue
+        if report["too_large"]:
+            print(f"{event_id}: too large for a snapshot (live join)")
+            continue
+        if report["missing"] or report["extra"] or report["stale"]:
+            drifted += 1
+            print(f"{event_id}: missing {len(report['missing'])}, "
+                  f"extra {len(report['extra'])}, stale {len(report['stale'])}")
+            if repair:
+                await all_crud.rebuild_event_personas(event_id)
+                print(f"{event_id}: rebuilt")
+    if command == "check":
+        print(f"{drifted} of {len(event_ids)} events drifted")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
@@ -0,0 +1,159 @@
+"""
+On-demand and sampled cProfile profiling of single requests.
+
+An admin opts a request in with the `X-Profile` header:
+
+    X-Profile: store    profile it, save the report and return its id in the
+                        `X-Profile-Id` response header
+    X-Profile: inline   profile it and return the report instead of the
+                        endpoint's response
+
+With PROFILE_SAMPLE_EVERY=N, one in every N requests (per worker) is also
+profiled and saved. Reports are stored in the `request_profiles` collection,
+so any worker can serve them; the last PROFILE_BUFFER_SIZE are kept. They are
+listed and downloaded (as .prof files for pstats/snakeviz) via the
+/admin/profiles endpoints.
+
+Each report splits the request's wall time into CPU time on the event loop
+thread and time spent in Mongo commands (measured by mongodb.CommandTimer).
+cProfile sees everything the thread runs, so only one request is profiled at a
+time; sampled requests are skipped while another profile is running, and
+concurrent requests may still show up in the call stats. For streamed
+responses only the work done before the first body chunk is covered.
+"""
+import asyncio
+import cProfile
+import io
+import itertools
+import logging
+import marshal
+import pstats
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from authentication import get_current_active_user, get_current_user, is_admin
+from config import settings
+from mongodb import CommandTime, current_command_time, database
+
+logger = logging.getLogger(__name__)
+
+HEADER = "X-Profile"
+MODES = ("store", "inline")
+TOP_FUNCTIONS = 40
+
+profile_collection = database.request_profiles
+
+_lock = asyncio.Lock()
+_request_counter = itertools.count(1)
+
+
+async def _admin_requested(request: Request) -> bool:
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        user = await get_current_active_user(await get_current_user(token))
+        return await is_admin(user)
+    except HTTPException:
+        return False
+
+
+def _summary(report: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in report.items() if k not in ("_id", "stats", "report")}
+
+
+async def _save(report: Dict[str, Any]) -> None:
+    """Store a report and drop all but the newest PROFILE_BUFFER_SIZE."""
+    try:
+        await profile_collection.insert_one({"_id": report["id"], **report})
+        oldest_kept = await profile_collection.find({}, {"_id": 1}).sort(
+            "_id", -1).skip(settings.PROFILE_BUFFER_SIZE - 1).to_list(length=1)
+        if oldest_kept:
+            await profile_collection.delete_many({"_id": {"$lt": oldest_kept[0]["_id"]}})
+    except Exception:
+        # never fail the profiled request because its report could not be kept
+        logger.exception("Saving profile %s failed", report["id"])
+
+
+async def list_profiles() -> List[Dict[str, Any]]:
+    # ids are ObjectId strings, so they sort by creation time
+    cursor = profile_collection.find({}, {"stats": 0, "report": 0}).sort("_id", -1)
+    return [_summary(report) async for report in cursor]
+
+
+async def get_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    return await profile_collection.find_one({"_id": profile_id})
+
+
+def report_json(report: Dict[str, Any]) -> Dict[str, Any]:
+    inline = _summary(report)
+    inline["started_at"] = inline["started_at"].isoformat()
+    inline["report"] = report["report"]
+    return inline
+
+
+async def _profile(request: Request, call_next, trigger: str):
+    profiler = cProfile.Profile()
+    command_time = CommandTime()
+    token = current_command_time.set(command_time)
+    started_at = datetime.utcnow()
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    profiler.enable()
+    try:
+        response = await call_next(request)
+    finally:
+        profiler.disable()
+        cpu = time.thread_time() - cpu
+        wall = time.perf_counter() - wall
+        current_command_time.reset(token)
+
+    stats = pstats.Stats(profiler)
+    text = io.StringIO()
+    stats.stream = text
+    stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+    mongo = command_time.micros / 1e6
+    report = {
+        "id": str(ObjectId()),
+        "trigger": trigger,
+        "method": request.method,
+        "path": request.url.path,
+        "status_code": response.status_code,
+        "started_at": started_at,
+        "wall_ms": round(wall * 1000, 3),
+        "cpu_ms": round(cpu * 1000, 3),
+        "mongo_ms": round(mongo * 1000, 3),
+        "mongo_commands": command_time.commands,
+        # awaiting anything else: executor queues, other requests, the network
+        "other_ms": round(max(wall - cpu - mongo, 0) * 1000, 3),
+        "report": text.getvalue(),
+        "stats": marshal.dumps(stats.stats),
+    }
+    return response, report
+
+
+async def middleware(request: Request, call_next):
+    mode = request.headers.get(HEADER, "").lower()
+    if mode in MODES and await _admin_requested(request):
+        async with _lock:
+            response, report = await _profile(request, call_next, "admin")
+        if mode == "inline":
+            return JSONResponse(report_json(report))
+        await _save(report)
+        response.headers["X-Profile-Id"] = report["id"]
+        return response
+
+    every = settings.PROFILE_SAMPLE_EVERY
+    if every > 0 and next(_request_counter) % every == 0 and not _lock.locked():
+        async with _lock:
+            response, report = await _profile(request, call_next, "sampled")
+        await _save(report)
+        return response
+
+    return await call_next(request)
+
@@ -0,0 +1,160 @@
+"""
+Admission control for expensive routes.
+
+* `rate_limit(...)` builds a FastAPI dependency enforcing a per-route token
+  bucket keyed by user or client IP. Buckets live in this worker's memory by
+  default, or in the `rate_limits` collection (shared by every worker) when
+  RATE_LIMIT_BACKEND=mongo.
+* `concurrency_limit(...)` builds a dependency capping how many requests may be
+  inside the guarded routes at once. Requests over the cap are shed right away
+  with 429 + Retry-After instead of queueing.
+
+Both count shed requests in `metrics`.
+"""
+import math
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Tuple
+
+from fastapi import HTTPException, Request
+from pymongo import ReturnDocument
+
+from config import settings
+from mongodb import database
+
+metrics: Dict[str, Dict[str, int]] = {
+    "rate_limited": defaultdict(int),
+    "overloaded": defaultdict(int),
+    "in_flight": defaultdict(int),
+}
+
+
+class MemoryBackend:
+    """Token buckets in a dict; each worker enforces its own budget."""
+    MAX_KEYS = 100_000
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def take(self, key: str, capacity: int, rate: float) -> float:
+        """
+        Take one token from `key`'s bucket.
+
+        :return: 0 if the request is admitted, otherwise seconds until a token is available.
+        """
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+        if len(self._buckets) >= self.MAX_KEYS and key not in self._buckets:
+            self._prune(now, capacity, rate)
+        self._buckets[key] = (tokens - 1, now)
+        return 0.0
+
+    def _prune(self, now: float, capacity: int, rate: float) -> None:
+        # buckets that have refilled completely carry no state worth keeping
+        full_after = capacity / rate
+        self._buckets = {k: v for k, v in self._buckets.items()
+                         if now - v[1] < full_after}
+
+
+class MongoBackend:
+    """Token buckets shared by all workers, updated atomically in one round trip."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def take(self, key: str, capacity: int, rate: float) -> float:
+        now = time.time()
+        refilled = {"$min": [capacity, {"$add": [
+            {"$ifNull": ["$tokens", capacity]},
+            {"$multiply": [{"$subtract": [now, {"$ifNull": ["$updated", now]}]}, rate]},
+        ]}]}
+        doc = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated": now}},
+                {"$set": {"admitted": {"$gte": ["$tokens", 1]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$admitted", {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    # an idle bucket is full again after capacity / rate seconds
+                    "expires_at": datetime.utcnow() + timedelta(seconds=capacity / rate),
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc["admitted"]:
+            return 0.0
+        return (1 - doc["tokens"]) / rate
+
+
+if settings.RATE_LIMIT_BACKEND == "mongo":
+    backend = MongoBackend(database.rate_limits)
+else:
+    backend = MemoryBackend()
+
+
+def client_ip(request: Request) -> str:
+    # behind a proxy, run uvicorn with --proxy-headers so this is the real client
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def _too_many(retry_after: float, detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def rate_limit(
+    name: str,
+    capacity: int,
+    per_seconds: float,
+    key_func: Callable[[Request], str] = client_ip,
+):
+    """
+    Dependency allowing `capacity` requests per `per_seconds` (with bursts up
+    to `capacity`) for each key returned by `key_func`.
+    """
+    rate = capacity / per_seconds
+
+    async def dependency(request: Request):
+        retry_after = await backend.take(
+            f"{name}:{key_func(request)}", capacity, rate)
+        if retry_after:
+            metrics["rate_limited"][name] += 1
+            raise _too_many(retry_after, "Rate limit exceeded")
+
+    return dependency
+
+
+def concurrency_limit(name: str, limit: int, retry_after: float = 1.0):
+    """
+    Dependency admitting at most `limit` requests at a time into the routes that
+    use it (per worker). Excess requests get 429 immediately.
+    """
+    async def dependency():
+        if metrics["in_flight"][name] >= limit:
+            metrics["overloaded"][name] += 1
+            raise _too_many(retry_after, "Server busy, try again later")
+        metrics["in_flight"][name] += 1
+        try:
+            yield
+        finally:
+            metrics["in_flight"][name] -= 1
+
+    return dependency
+
+
+# Separate caps: an LLM call holds its slot for up to LLM_TIMEOUT_SECONDS, so
+# sharing one with login would let a few AI requests lock everyone out.
+llm_slots = concurrency_limit("llm", settings.LLM_CONCURRENCY_LIMIT)
+bcrypt_slots = concurrency_limit("bcrypt", settings.BCRYPT_CONCURRENCY_LIMIT)
@@ -0,0 +1,90 @@
+"""
+Opt-in raw read path for hot list endpoints.
+
+The default read path decodes every document into a dict, builds a pydantic
+model from it in the CRUD layer, and FastAPI then validates and re-serializes
+that model against the response_model. For read-only endpoints that just hand
+documents back, CRUD functions can instead read through `raw_collection`, whose
+CodecOptions carry type decoders turning ObjectId and datetime into their JSON
+strings while the BSON is being decoded. `RawJSONResponse` then writes those
+documents out with a typed decoder derived from the response model: the same
+keys, defaults and order as the model would produce, without the model.
+
+RawBSONDocument was tried as the document class too, but its lazy field access
+costs more CPU than pymongo's C decoder; bench_raw_bson.py compares all three.
+"""
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple, Type
+
+from bson import ObjectId
+from bson.codec_options import CodecOptions, TypeDecoder, TypeRegistry
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+
+class _ObjectIdAsString(TypeDecoder):
+    bson_type = ObjectId
+
+    def transform_bson(self, value: ObjectId) -> str:
+        return str(value)
+
+
+class _DatetimeAsString(TypeDecoder):
+    bson_type = datetime
+
+    def transform_bson(self, value: datetime) -> str:
+        return value.isoformat()
+
+
+RAW_CODEC_OPTIONS = CodecOptions(
+    type_registry=TypeRegistry([_ObjectIdAsString(), _DatetimeAsString()]))
+
+
+def raw_collection(collection):
+    """The same collection, decoding documents straight into JSON-ready values."""
+    return collection.with_options(codec_options=RAW_CODEC_OPTIONS)
+
+
+class RawDecoder:
+    """Writes documents read through raw_collection as JSON shaped like `model`."""
+
+    def __init__(self, model: Type[BaseModel]):
+        self.fields: List[Tuple[str, Any]] = []
+        for name, info in model.model_fields.items():
+            default = None if info.is_required() else info.get_default(
+                call_default_factory=True)
+            self.fields.append((info.alias or name, default))
+
+    def shape(self, doc: dict) -> dict:
+        return {key: doc.get(key, default) for key, default in self.fields}
+
+    def encode(self, doc: dict) -> str:
+        return json.dumps(self.shape(doc), separators=(",", ":"))
+
+    def encode_many(self, docs: List[dict]) -> str:
+        return json.dumps([self.shape(doc) for doc in docs], separators=(",", ":"))
+
+
+_decoders = {}
+
+
+def decoder_for(model: Type[BaseModel]) -> RawDecoder:
+    if model not in _decoders:
+        _decoders[model] = RawDecoder(model)
+    return _decoders[model]
+
+
+class RawJSONResponse(Response):
+    media_type = "application/json"
+
+    def __init__(self, content: Any, model: Type[BaseModel], status_code: int = 200,
+                 headers: Optional[dict] = None):
+        self.model = model
+        super().__init__(content, status_code=status_code, headers=headers)
+
+    def render(self, content: Any) -> bytes:
+        decoder = decoder_for(self.model)
+        if isinstance(content, dict):
+            return decoder.encode(content).encode("utf-8")
+        return decoder.encode_many(content).encode("utf-8")
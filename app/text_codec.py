@@ -0,0 +1,118 @@
+"""
+Transparent compression of large text fields (AI prompts and responses).
+
+Text longer than AI_TEXT_COMPRESSION_THRESHOLD bytes is stored as BSON binary
+whose user-defined subtype says which codec produced it; shorter text stays a
+plain string. `decompress_text` accepts either form, so readers never need to
+know which one a record has.
+
+zstd is used when AI_TEXT_CODEC=zstd and the `zstandard` package is installed;
+otherwise zlib from the standard library.
+
+Migrating existing records (prints the storage saved):
+
+    python text_codec.py [--dry-run]
+"""
+import zlib
+from typing import Dict, Iterable, Union
+
+from bson.binary import Binary
+
+from config import settings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# user-defined binary subtypes double as the codec marker
+SUBTYPE_ZLIB = 0x80
+SUBTYPE_ZSTD = 0x81
+
+
+def compress_text(text: str) -> Union[str, Binary]:
+    """Compress `text` if it is over the threshold and compression pays off."""
+    raw = text.encode("utf-8")
+    if len(raw) < settings.AI_TEXT_COMPRESSION_THRESHOLD:
+        return text
+    if settings.AI_TEXT_CODEC == "zstd" and zstandard is not None:
+        packed, subtype = zstandard.ZstdCompressor(level=9).compress(raw), SUBTYPE_ZSTD
+    else:
+        packed, subtype = zlib.compress(raw, 6), SUBTYPE_ZLIB
+    if len(packed) >= len(raw):
+        return text
+    return Binary(packed, subtype)
+
+
+def decompress_text(value: Union[str, bytes, Binary, None]) -> Union[str, None]:
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, Binary) and value.subtype == SUBTYPE_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read this record")
+        return zstandard.ZstdDecompressor().decompress(bytes(value)).decode("utf-8")
+    return zlib.decompress(bytes(value)).decode("utf-8")
+
+
+def stored_size(value: Union[str, bytes, None]) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(value)
+
+
+def pack_fields(doc: dict, fields: Iterable[str], preview_chars: int) -> dict:
+    """
+    Return a copy of `doc` with `fields` compressed, plus `<field>_length`
+    (characters) and `<field>_preview` so listings never need the body.
+    """
+    packed = dict(doc)
+    for field in fields:
+        text = doc.get(field)
+        if not isinstance(text, str):
+            continue
+        packed[field] = compress_text(text)
+        packed[f"{field}_length"] = len(text)
+        packed[f"{field}_preview"] = text[:preview_chars]
+    return packed
+
+
+def unpack_fields(doc: dict, fields: Iterable[str]) -> dict:
+    for field in fields:
+        if field in doc:
+            doc[field] = decompress_text(doc[field])
+    return doc
+
+
+async def migrate_collection(collection, fields: Iterable[str], preview_chars: int,
+                             dry_run: bool = False) -> Dict[str, int]:
+    """Compress `fields` on every document written before compression existed."""
+    fields = list(fields)
+    stats = {"documents": 0, "bytes_before": 0, "bytes_after": 0}
+    query = {"$or": [{field: {"$type": "string"}, f"{field}_length": {"$exists": False}}
+                     for field in fields]}
+    async for doc in collection.find(query, {field: 1 for field in fields}):
+        packed = pack_fields(doc, fields, preview_chars)
+        changes = {k: v for k, v in packed.items() if k != "_id"}
+        for field in fields:
+            stats["bytes_before"] += stored_size(doc.get(field))
+            stats["bytes_after"] += stored_size(packed.get(field))
+        if not dry_run:
+            await collection.update_one({"_id": doc["_id"]}, {"$set": changes})
+        stats["documents"] += 1
+    return stats
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+    from all_crud import ai_summary_collection, AI_SUMMARY_PREVIEW_CHARS, AI_SUMMARY_TEXT_FIELDS
+
+    dry_run = "--dry-run" in sys.argv
+    stats = asyncio.run(migrate_collection(
+        ai_summary_collection, AI_SUMMARY_TEXT_FIELDS, AI_SUMMARY_PREVIEW_CHARS, dry_run))
+    saved = stats["bytes_before"] - stats["bytes_after"]
+    percent = 100 * saved / stats["bytes_before"] if stats["bytes_before"] else 0
+    print(f"{'Would compress' if dry_run else 'Compressed'} {stats['documents']} records: "
+          f"{stats['bytes_before']} -> {stats['bytes_after']} bytes ({saved} saved, {percent:.1f}%)")
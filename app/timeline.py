@@ -0,0 +1,124 @@
+"""
+Per-event check-in timeline rollups for live organizer dashboards.
+
+Every attendance write increments a per-event, per-minute counter in the
+`checkin_timeline` collection (one bulk upsert per batch of check-ins), so a
+dashboard read touches one small document per minute instead of scanning the
+event's attendance. 5-minute and hourly buckets are folded from the minute
+counters at read time.
+
+Rebuilding the counters from `attendances` (e.g. for data written before the
+rollup existed):
+
+    python timeline.py [event_id ...]
+"""
+import asyncio
+import sys
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+import all_crud
+from mongodb import database
+
+timeline_collection = database.checkin_timeline
+
+BUCKETS = {"1m": 60, "5m": 300, "1h": 3600}
+
+
+def _minute(scanned_at: Any) -> datetime:
+    if isinstance(scanned_at, str):
+        scanned_at = datetime.fromisoformat(scanned_at)
+    if not isinstance(scanned_at, datetime):
+        scanned_at = datetime.utcnow()
+    if scanned_at.tzinfo:
+        scanned_at = scanned_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return scanned_at.replace(second=0, microsecond=0)
+
+
+async def ensure_indexes() -> None:
+    await timeline_collection.create_index(
+        [("event_id", 1), ("minute", 1)], unique=True)
+
+
+async def record(docs: List[dict]) -> None:
+    """Attendance listener: count the new check-ins into their minute buckets."""
+    counts = Counter((doc["event_id"], _minute(doc.get("scanned_at"))) for doc in docs)
+    if not counts:
+        return
+    await timeline_collection.bulk_write([
+        UpdateOne({"event_id": event_id, "minute": minute},
+                  {"$inc": {"count": count}}, upsert=True)
+        for (event_id, minute), count in counts.items()
+    ], ordered=False)
+
+
+all_crud.attendance_listeners.append(record)
+
+
+async def get_timeline(
+    event_id: str,
+    bucket: str = "1m",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Check-ins per bucket for an event, oldest first. Buckets without check-ins
+    are omitted.
+
+    :param bucket: "1m", "5m" or "1h".
+    :return: A list of {"start": bucket start, "count": check-ins} dictionaries.
+    """
+    query: Dict[str, Any] = {"event_id": ObjectId(event_id)}
+    if start or end:
+        query["minute"] = {}
+        if start:
+            query["minute"]["$gte"] = start
+        if end:
+            query["minute"]["$lt"] = end
+    cursor = timeline_collection.find(
+        query, {"_id": 0, "minute": 1, "count": 1}).sort("minute", 1)
+
+    size = BUCKETS[bucket]
+    points: List[Dict[str, Any]] = []
+    async for doc in cursor:
+        minute = doc["minute"]
+        offset = (minute - datetime.min).total_seconds() % size
+        bucket_start = minute - timedelta(seconds=offset)
+        if points and points[-1]["start"] == bucket_start:
+            points[-1]["count"] += doc["count"]
+        else:
+            points.append({"start": bucket_start, "count": doc["count"]})
+    return points
+
+
+async def rebuild(event_id: str) -> int:
+    """Recompute an event's minute counters from its attendance records."""
+    oid = ObjectId(event_id)
+    cursor = all_crud.attendance_collection.aggregate([
+        {"$match": {"event_id": oid}},
+        {"$group": {
+            "_id": {"$dateTrunc": {"date": {"$toDate": "$scanned_at"}, "unit": "minute"}},
+            "count": {"$sum": 1},
+        }},
+    ])
+    rows = [{"event_id": oid, "minute": doc["_id"], "count": doc["count"]}
+            async for doc in cursor if doc["_id"] is not None]
+    await timeline_collection.delete_many({"event_id": oid})
+    if rows:
+        await timeline_collection.insert_many(rows)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    async def main(event_ids: List[str]):
+        await ensure_indexes()
+        if not event_ids:
+            event_ids = [str(e) for e in await all_crud.attendance_collection.distinct("event_id")]
+        for event_id in event_ids:
+            print(f"{event_id}: {await rebuild(event_id)} minute buckets")
+
+    asyncio.run(main(sys.argv[1:]))
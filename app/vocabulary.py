@@ -0,0 +1,175 @@
+"""
+Shared vocabulary for profile interests and event tags.
+
+Every distinct (normalized) term gets a stable integer code stored in the
+`vocabulary` collection. Profiles and events keep their original string lists
+and store the matching code arrays next to them (`interest_codes`, `tag_codes`),
+so comparisons and aggregations can work on ints.
+
+An in-memory bidirectional map is loaded at startup and refreshed incrementally.
+Codes are allocated in blocks by concurrent workers and may be inserted out of
+order, so a refresh reads codes above the highest known one plus any gaps below
+it. `load_codes()` fetches specific codes on demand for callers that cannot
+wait for the next refresh.
+"""
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from config import settings
+from mongodb import database
+
+logger = logging.getLogger(__name__)
+
+vocabulary_collection = database.vocabulary
+counter_collection = database.counters
+
+_term_to_code: Dict[str, int] = {}
+_code_to_term: Dict[int, str] = {}
+_max_code = 0
+_lock = asyncio.Lock()
+
+
+def normalize(term: str) -> str:
+    """Case-fold and collapse whitespace: "  Data   Science" -> "data science"."""
+    return " ".join(term.split()).casefold()
+
+
+def _remember(code: int, term: str) -> None:
+    global _max_code
+    _term_to_code[term] = code
+    _code_to_term[code] = term
+    _max_code = max(_max_code, code)
+
+
+def code_for(term: str) -> Optional[int]:
+    return _term_to_code.get(normalize(term))
+
+
+def term_for(code: int) -> Optional[str]:
+    return _code_to_term.get(code)
+
+
+def terms_for(codes: Iterable[int]) -> List[str]:
+    return [_code_to_term[c] for c in codes if c in _code_to_term]
+
+
+async def ensure_indexes() -> None:
+    await vocabulary_collection.create_index("term", unique=True)
+
+
+async def load() -> None:
+    """Load the whole vocabulary into memory. Called once at startup."""
+    _term_to_code.clear()
+    _code_to_term.clear()
+    await refresh()
+
+
+def _gaps() -> List[int]:
+    # codes below the highest known one that we have not seen: either still
+    # being inserted by another worker or never used (lost an intern race)
+    return [c for c in range(1, _max_code + 1) if c not in _code_to_term]
+
+
+async def refresh() -> int:
+    """Pull in codes created (by any worker) since the last load/refresh."""
+    query = {"_id": {"$gt": _max_code}}
+    gaps = _gaps()
+    if gaps:
+        query = {"$or": [query, {"_id": {"$in": gaps}}]}
+    cursor = vocabulary_collection.find(query)
+    added = 0
+    async for doc in cursor:
+        _remember(doc["_id"], doc["term"])
+        added += 1
+    return added
+
+
+async def load_codes(codes: Iterable[int]) -> None:
+    """Make sure `codes` can be looked up, reading unknown ones from the collection."""
+    missing = list({c for c in codes if c not in _code_to_term})
+    if missing:
+        async for doc in vocabulary_collection.find({"_id": {"$in": missing}}):
+            _remember(doc["_id"], doc["term"])
+
+
+async def _allocate(count: int) -> int:
+    """Reserve `count` consecutive codes and return the first one."""
+    counter = await counter_collection.find_one_and_update(
+        {"_id": "vocabulary"},
+        {"$inc": {"seq": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return counter["seq"] - count + 1
+
+
+async def intern(terms: Iterable[str]) -> List[int]:
+    """
+    Map terms to their codes, creating codes for terms seen for the first time.
+    Blank terms are dropped and duplicates (after normalization) collapsed.
+
+    :param terms: Raw interest or tag strings.
+    :return: The codes, in first-seen order.
+    """
+    normalized = list(dict.fromkeys(
+        n for n in (normalize(t) for t in terms if t) if n))
+    missing = [t for t in normalized if t not in _term_to_code]
+    if missing:
+        async with _lock:
+            await refresh()
+            missing = [t for t in missing if t not in _term_to_code]
+            if missing:
+                first = await _allocate(len(missing))
+                for code, term in enumerate(missing, start=first):
+                    try:
+                        await vocabulary_collection.insert_one(
+                            {"_id": code, "term": term})
+                        _remember(code, term)
+                    except DuplicateKeyError:
+                        # another worker interned it first; use its code
+                        doc = await vocabulary_collection.find_one({"term": term})
+                        _remember(doc["_id"], term)
+    return [_term_to_code[t] for t in normalized]
+
+
+async def refresh_forever() -> None:
+    """Background task keeping this worker's map in step with the others."""
+    while True:
+        await asyncio.sleep(settings.VOCABULARY_REFRESH_SECONDS)
+        try:
+            await refresh()
+        except Exception:
+            logger.exception("Vocabulary refresh failed")
+
+
+async def backfill_codes() -> None:
+    """
+    One-off migration: add interest_codes/tag_codes to profiles and events
+    written before the vocabulary existed.
+    """
+    for collection, field, codes_field in (
+        (database.user_profiles, "interests", "interest_codes"),
+        (database.events, "tags", "tag_codes"),
+    ):
+        updated = 0
+        cursor = collection.find(
+            {codes_field: {"$exists": False}}, {field: 1})
+        async for doc in cursor:
+            codes = await intern(doc.get(field) or [])
+            await collection.update_one(
+                {"_id": doc["_id"]}, {"$set": {codes_field: codes}})
+            updated += 1
+        print(f"Backfilled {codes_field} on {updated} documents")
+
+
+if __name__ == "__main__":
+    async def main():
+        await ensure_indexes()
+        await load()
+        await backfill_codes()
+
+    asyncio.run(main())